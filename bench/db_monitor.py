@@ -0,0 +1,33 @@
+from collections import defaultdict
+
+from pymongo import monitoring
+
+
+class RoundTripCounter(monitoring.CommandListener):
+    """Counts the commands sent to MongoDB and the time spent on them, per command name."""
+
+    def __init__(self):
+        self.commands = defaultdict(int)
+        self.seconds = defaultdict(float)
+        self.errors = 0
+
+    @property
+    def total(self) -> int:
+        return sum(self.commands.values())
+
+    def reset(self):
+        self.commands.clear()
+        self.seconds.clear()
+        self.errors = 0
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self.commands[event.command_name] += 1
+        self.seconds[event.command_name] += event.duration_micros / 1e6
+
+    def failed(self, event):
+        self.commands[event.command_name] += 1
+        self.seconds[event.command_name] += event.duration_micros / 1e6
+        self.errors += 1
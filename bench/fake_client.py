@@ -0,0 +1,30 @@
+import asyncio
+import itertools
+from types import SimpleNamespace
+
+
+class FakeClient:
+    """
+    The slice of a Pyrogram Client the price checker uses. Sends are recorded
+    instead of reaching Telegram and take `send_latency` seconds each.
+    """
+
+    def __init__(self, http, send_latency: float = 0.0):
+        self.http = http
+        self.send_latency = send_latency
+        self.sent = []
+        self.documents = []
+        self._message_ids = itertools.count(1)
+
+    async def _reply(self, chat_id):
+        if self.send_latency > 0:
+            await asyncio.sleep(self.send_latency)
+        return SimpleNamespace(id=next(self._message_ids), chat=SimpleNamespace(id=chat_id))
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append((chat_id, text))
+        return await self._reply(chat_id)
+
+    async def send_document(self, chat_id, document, **kwargs):
+        self.documents.append((chat_id, document))
+        return await self._reply(chat_id)
@@ -0,0 +1,70 @@
+import json
+import random
+import asyncio
+import zlib
+
+import httpx
+
+
+def base_price(url: str) -> int:
+    """Stable starting price of a product, also used when seeding the database."""
+    return 199 + zlib.crc32(url.encode()) % 50000
+
+
+class MockBuyhatke:
+    """
+    Stands in for the buyhatke endpoint through an httpx.MockTransport.
+    Each request sleeps for about `latency` seconds, fails with `error_rate`
+    probability (half HTTP 500s, half 200s carrying an "error" field) and
+    changes the product's price with `volatility` probability.
+    """
+
+    def __init__(self, latency: float = 0.2, error_rate: float = 0.02, volatility: float = 0.1, seed: int = 1):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.volatility = volatility
+        self.random = random.Random(seed)
+        self.prices = {}
+        self.requests = 0
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    def _price(self, url: str) -> int:
+        price = self.prices.get(url) or base_price(url)
+        if self.random.random() < self.volatility:
+            price = max(1, int(price * self.random.uniform(0.8, 1.2)))
+        self.prices[url] = price
+        return price
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        if self.latency > 0:
+            await asyncio.sleep(self.random.expovariate(1 / self.latency))
+
+        url = request.url.params.get("product_url", "")
+        roll = self.random.random()
+        if roll < self.error_rate / 2:
+            return httpx.Response(500, json={"detail": "Upstream error"})
+        if roll < self.error_rate:
+            return httpx.Response(200, json={"error": "Product not available"})
+
+        price = self._price(url)
+        original = int(price * 1.3)
+        body = {
+            "currencySymbol": "₹",
+            "dealsData": {
+                "product_data": {
+                    "name": f"Bench product {zlib.crc32(url.encode())}",
+                    "site_name": "amazon" if "amazon" in url else "flipkart",
+                    "cur_price": price,
+                    "orgi_price": original,
+                    "discount": round((original - price) / original * 100),
+                    "rating": 4.2,
+                    "ratingCount": 1200,
+                    "thumbnailImages": [f"https://img.example.com/{zlib.crc32(url.encode())}.jpg"],
+                }
+            },
+        }
+        return httpx.Response(200, content=json.dumps(body), headers={"content-type": "application/json"})
+
@@ -0,0 +1,278 @@
+"""
+Offline benchmark of run_price_check.
+
+buyhatke is replaced by a local mock, Telegram by a recording fake client and
+the database by a throwaway one on a local MongoDB, so runs are repeatable and
+safe. Every catalog size runs in its own process, and the catalog is seeded
+by yet another one, so the peak RSS covers only the measured check.
+
+    python -m bench.price_check                                 # 1k, 10k and 100k products
+    python -m bench.price_check --sizes 10000 --latency 0.05 --error-rate 0.05
+    python -m bench.price_check --out bench/results.jsonl       # keep a history to compare against
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+
+from bench.db_monitor import RoundTripCounter
+from bench.fake_client import FakeClient
+from bench.mock_api import MockBuyhatke, base_price
+
+SEED_BATCH = 5000
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the price checker against local stand-ins.")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma separated catalog sizes")
+    parser.add_argument("--products", type=int, help="run a single size in this process (used internally)")
+    parser.add_argument("--trackers", type=int, default=2, help="users tracking each product")
+    parser.add_argument("--latency", type=float, default=0.2, help="mean mock API latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--volatility", type=float, default=0.1, help="chance a price changes per check")
+    parser.add_argument("--send-latency", type=float, default=0.0, help="seconds each fake Telegram send takes")
+    parser.add_argument("--workers", type=int, help="FETCH_WORKERS, defaults to config")
+    parser.add_argument("--api-rate", type=float, default=0, help="API_RATE/SOURCE_RATE, 0 = unlimited")
+    parser.add_argument("--notify-rate", type=float, default=0, help="NOTIFY_RATE, 0 = unlimited")
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017")
+    parser.add_argument("--db", default="ecom-tracker-bench", help="dropped before and after every run")
+    parser.add_argument("--keep-db", action="store_true")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="append results as JSON lines to this file")
+    parser.add_argument("--json", action="store_true", help="print the result as JSON (used internally)")
+    parser.add_argument("--seed-only", action="store_true", help="only (re)create the --products catalog (used internally)")
+    return parser.parse_args(argv)
+
+
+def configure_env(args):
+    """Points config.py at the bench database and limits; must run before any helper import."""
+    if args.db == "ecom-tracker":
+        sys.exit("Refusing to benchmark against the bot's own database.")
+    os.environ.setdefault("API_ID", "0")
+    os.environ.setdefault("ADMIN", "0")
+    os.environ.update({
+        "MONGO_URI": args.mongo_uri,
+        "DB_NAME": args.db,
+        "API_RATE": str(args.api_rate),
+        "SOURCE_RATE": str(args.api_rate),
+        "AMAZON_RATE": str(args.api_rate),
+        "FLIPKART_RATE": str(args.api_rate),
+        "NOTIFY_RATE": str(args.notify_rate),
+        "NOTIFY_CHAT_INTERVAL": "0",
+        "RUN_LOGS_MAX_UPLOAD": str(1024 ** 3),
+    })
+    if args.workers:
+        os.environ["FETCH_WORKERS"] = str(args.workers)
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+async def seed(n: int, trackers: int):
+    from helper.database import products, users
+
+    user_count = max(1, n * trackers // 5)
+    trackings = {}
+    batch = []
+    for i in range(n):
+        source = "amazon" if i % 2 else "flipkart"
+        url = f"https://www.{source}.com/dp/BENCH{i:08d}"
+        price = base_price(url)
+        batch.append({
+            "_id": f"bench{i:08d}",
+            "product_key": f"{source}:BENCH{i:08d}",
+            "url": url,
+            "source": source,
+            "currency": "₹",
+            "product_name": f"Bench product {i}",
+            "current_price": {"string": str(price), "int": price},
+            "original_price": {"string": str(int(price * 1.3)), "int": int(price * 1.3)},
+            "images": [],
+        })
+        for k in range(trackers):
+            user_id = str(100000 + (i * 7 + k * 13) % user_count)
+            trackings.setdefault(user_id, set()).add(f"bench{i:08d}")
+        if len(batch) >= SEED_BATCH:
+            await products.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await products.insert_many(batch, ordered=False)
+
+    docs = [{"user_id": user_id, "trackings": sorted(ids)} for user_id, ids in trackings.items()]
+    for start in range(0, len(docs), SEED_BATCH):
+        await users.insert_many(docs[start:start + SEED_BATCH], ordered=False)
+    return len(docs)
+
+
+async def seed_only(args) -> dict:
+    from helper.database import client as mongo
+
+    await mongo.drop_database(args.db)
+    started = time.monotonic()
+    user_count = await seed(args.products, args.trackers)
+    return {"users": user_count, "seed_seconds": round(time.monotonic() - started, 2)}
+
+
+def seed_in_subprocess(args) -> dict:
+    """Seeds the catalog from another process, so its documents never count towards our peak RSS."""
+    output = subprocess.check_output(
+        [sys.executable, "-m", "bench.price_check", *child_args(args), "--products", str(args.products), "--seed-only", "--json"],
+        text=True,
+        cwd=ROOT,
+    )
+    return json.loads(output.strip().splitlines()[-1])
+
+
+async def run_size(args, counter: RoundTripCounter) -> dict:
+    from helper.database import client as mongo, ensure_indexes
+    from helper.http_client import create_http_client
+    from helper.price_checker import run_price_check, peak_memory_mb
+    from helper.run_log import list_runs, read_run
+    from config import Checker
+
+    seeded = seed_in_subprocess(args)
+    await ensure_indexes()
+
+    mock = MockBuyhatke(args.latency, args.error_rate, args.volatility, args.seed)
+    http = create_http_client(transport=mock.transport())
+    client = FakeClient(http, args.send_latency)
+
+    counter.reset()
+    started = time.monotonic()
+    await run_price_check(client)
+    elapsed = time.monotonic() - started
+    round_trips = dict(counter.commands)
+    db_seconds = sum(counter.seconds.values())
+    await http.aclose()
+
+    runs = list_runs()
+    checks = list(read_run(runs[0], "check")) if runs else []
+    latencies = [record["latency"] for record in checks if record.get("latency") is not None]
+    statuses = {}
+    for record in checks:
+        statuses[record.get("status")] = statuses.get(record.get("status"), 0) + 1
+
+    if not args.keep_db:
+        await mongo.drop_database(args.db)
+
+    return {
+        "at": datetime.now().isoformat(timespec="seconds"),
+        "products": args.products,
+        "users": seeded["users"],
+        "workers": Checker.FETCH_WORKERS,
+        "latency": args.latency,
+        "error_rate": args.error_rate,
+        "volatility": args.volatility,
+        "seed_seconds": seeded["seed_seconds"],
+        "seconds": round(elapsed, 2),
+        "products_per_sec": round(len(checks) / elapsed, 2) if elapsed else 0,
+        "p50_latency": round(percentile(latencies, 50), 4),
+        "p99_latency": round(percentile(latencies, 99), 4),
+        "statuses": statuses,
+        "messages_sent": len(client.sent),
+        "api_requests": mock.requests,
+        "db_round_trips": sum(round_trips.values()),
+        "db_round_trips_by_command": round_trips,
+        "db_seconds": round(db_seconds, 2),
+        "db_errors": counter.errors,
+        "peak_rss_mb": round(peak_memory_mb(), 1),
+    }
+
+
+def run_single(args) -> dict:
+    configure_env(args)
+    if args.seed_only:
+        return asyncio.run(seed_only(args))
+    # Command listeners only attach to clients created afterwards, i.e. on import of helper.database.
+    from pymongo import monitoring
+    counter = RoundTripCounter()
+    monitoring.register(counter)
+
+    # Run logs go to ./logs/runs, keep them out of the checkout.
+    with tempfile.TemporaryDirectory(prefix="pricebot-bench-") as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            return asyncio.run(run_size(args, counter))
+        finally:
+            os.chdir(cwd)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def child_args(args) -> list:
+    """The options of this invocation that a single-size run needs."""
+    argv = [
+        "--trackers", str(args.trackers),
+        "--latency", str(args.latency),
+        "--error-rate", str(args.error_rate),
+        "--volatility", str(args.volatility),
+        "--send-latency", str(args.send_latency),
+        "--api-rate", str(args.api_rate),
+        "--notify-rate", str(args.notify_rate),
+        "--mongo-uri", args.mongo_uri,
+        "--db", args.db,
+        "--seed", str(args.seed),
+    ]
+    if args.workers:
+        argv += ["--workers", str(args.workers)]
+    if args.keep_db:
+        argv.append("--keep-db")
+    return argv
+
+
+def print_table(results: list):
+    header = f"{'products':>9} {'prod/s':>9} {'p50':>8} {'p99':>8} {'db trips':>9} {'db s':>7} {'rss MB':>8} {'total s':>8}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r['products']:>9} {r['products_per_sec']:>9.1f} {r['p50_latency']:>8.3f} {r['p99_latency']:>8.3f} "
+            f"{r['db_round_trips']:>9} {r['db_seconds']:>7.1f} {r['peak_rss_mb']:>8.0f} {r['seconds']:>8.1f}"
+        )
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.products:
+        result = run_single(args)
+        print(json.dumps(result) if args.json else json.dumps(result, indent=2))
+        return
+
+    revision = git_revision()
+    results = []
+    for size in (int(s) for s in args.sizes.split(",") if s.strip()):
+        print(f"Benchmarking {size} products...", file=sys.stderr)
+        output = subprocess.check_output(
+            [sys.executable, "-m", "bench.price_check", *child_args(args), "--products", str(size), "--json"],
+            text=True,
+        )
+        result = json.loads(output.strip().splitlines()[-1])
+        result["revision"] = revision
+        results.append(result)
+
+    print_table(results)
+    if args.out:
+        with open(args.out, "a", encoding="utf-8") as f:
+            for result in results:
+                f.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    main()
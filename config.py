@@ -31,7 +31,96 @@ class Telegram():
 
 class Db():
   MONGO_URI = os.getenv("MONGO_URI", "your mongo uri") 
-  DB_NAME = "ecom-tracker"
+  DB_NAME = os.getenv("DB_NAME", "ecom-tracker")
+  POOL_SIZE = int(os.getenv("MONGO_POOL_SIZE", "50"))                    #Max connections held by the async client
+  MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "5"))
+
+  
+class Checker():
+  FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", "8"))                   #Concurrent buyhatke lookups during a price check
+  API_TIMEOUT = float(os.getenv("API_TIMEOUT", "45"))
+  API_RATE = float(os.getenv("API_RATE", "5"))                            #Requests/sec to the buyhatke endpoint, 0 = unlimited
+  SOURCE_RATE = float(os.getenv("SOURCE_RATE", "2"))                      #Default requests/sec per source (amazon, flipkart, ...)
+  SOURCE_RATE_LIMITS = {                                                  #Per-source overrides of SOURCE_RATE
+    "amazon": float(os.getenv("AMAZON_RATE", "2")),
+    "flipkart": float(os.getenv("FLIPKART_RATE", "2")),
+  }
+  LOOKUP_CACHE_TTL = int(os.getenv("LOOKUP_CACHE_TTL", "300"))            #Seconds a buyhatke response is reused for the same product URL
+  LOOKUP_CACHE_SIZE = int(os.getenv("LOOKUP_CACHE_SIZE", "2000"))          #Max cached responses, least recently used are evicted
+  SCAN_BATCH_SIZE = int(os.getenv("SCAN_BATCH_SIZE", "500"))              #Users/products read per query while scanning
+  PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "100"))     #Fetched results waiting to be diffed/stored/notified
+  MAX_PENDING_NOTIFICATIONS = int(os.getenv("MAX_PENDING_NOTIFICATIONS", "1000"))  #Alerts in flight before the pipeline waits
+  WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", "500"))            #Product updates per bulk_write
+  WRITE_FLUSH_INTERVAL = float(os.getenv("WRITE_FLUSH_INTERVAL", "5"))    #Max seconds an update waits in the buffer
+
+
+class RunLogs():
+  DIR = os.path.join("logs", "runs")
+  KEEP_RUNS = int(os.getenv("RUN_LOGS_KEEP", "20"))                       #Compressed run logs kept on disk
+  MAX_UPLOAD_BYTES = int(os.getenv("RUN_LOGS_MAX_UPLOAD", str(20 * 1024 * 1024)))  #Cap of the .jsonl.gz sent to the log topic
+  BUFFER_RECORDS = 500                                                    #Records buffered in memory before a background write
+
+
+class Http():
+  MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+  MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))              #Idle connections kept open for reuse
+  KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+  CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+  DEFAULT_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))                #Callers pass their own timeout where it differs
+  HTTP2 = os.getenv("HTTP2", "false").lower() == "true"                   #Needs the h2 package (pip install httpx[http2])
+
+
+class Pending():
+  TTL = int(os.getenv("PENDING_TTL", "1800"))                             #Seconds a looked-up link can still be tracked
+  MAX_ENTRIES = int(os.getenv("PENDING_MAX_ENTRIES", "5000"))             #In-memory cap, least recently used are dropped first
+  USE_MONGO = os.getenv("PENDING_USE_MONGO", "false").lower() == "true"   #Share pending tracks between bot processes
+
+
+class Scheduler():
+  BASE_INTERVAL = int(os.getenv("CHECK_BASE_INTERVAL", "18000"))         #Seconds between checks of an average product
+  MIN_INTERVAL = int(os.getenv("CHECK_MIN_INTERVAL", "300"))
+  MAX_INTERVAL = int(os.getenv("CHECK_MAX_INTERVAL", "172800"))
+  HOURLY_BUDGET = int(os.getenv("CHECK_HOURLY_BUDGET", "2000"))          #Target buyhatke lookups per hour, intervals are scaled to fit
+  VOLATILITY_WEIGHT = 8                                                   #How much a frequently changing price shortens the interval
+  POPULARITY_WEIGHT = 0.5                                                 #How much each doubling of trackers shortens the interval
+  MAX_BATCH = int(os.getenv("CHECK_MAX_BATCH", "500"))                   #Due products taken per scheduler tick
+  TICK = 300                                                              #Max seconds the scheduler sleeps between ticks
+  CLEANUP_INTERVAL = 21600                                                #Seconds between dangling-reference cleanups
+  BUDGET_REFRESH = int(os.getenv("CHECK_BUDGET_REFRESH", "900"))          #Seconds the budget scale is reused before re-summing all products
+
+
+class Resilience():
+  BREAKER_THRESHOLD = int(os.getenv("BREAKER_THRESHOLD", "5"))            #Transient buyhatke failures in a row that open the circuit
+  BREAKER_RESET = float(os.getenv("BREAKER_RESET", "60"))                 #Seconds the circuit stays open before one probe request
+  MAX_ATTEMPTS = int(os.getenv("LOOKUP_MAX_ATTEMPTS", "3"))               #Tries per lookup during a price check, retries spend the run's budget
+  RUN_RETRY_BUDGET = int(os.getenv("RUN_RETRY_BUDGET", "50"))             #Retries one price-check run may spend in total
+  RETRY_BASE_DELAY = 1.0                                                  #Seconds, doubled per attempt and jittered
+  RETRY_MAX_DELAY = 15.0
+  QUARANTINE_AFTER = int(os.getenv("QUARANTINE_AFTER", "5"))              #Permanent failures in a row (delisted, PID not found) before a product is parked
+  QUARANTINE_TIME = int(os.getenv("QUARANTINE_TIME", str(7 * 86400)))     #First quarantine, doubled for every further failure
+  QUARANTINE_MAX = int(os.getenv("QUARANTINE_MAX", str(30 * 86400)))
+
+
+class Workers():
+  ID = os.getenv("WORKER_ID", "")                                         #Lease owner name, defaults to <hostname>-<pid>
+  BATCH = int(os.getenv("WORKER_BATCH", "200"))                           #Due products leased per claim
+  LEASE_TTL = int(os.getenv("WORKER_LEASE_TTL", "600"))                   #Seconds a lease survives without a heartbeat
+  CHECK_IN_BOT = os.getenv("CHECK_IN_BOT", "true").lower() == "true"      #Set to false when worker.py processes do all the checking
+
+
+class Stats():
+  REFRESH_INTERVAL = int(os.getenv("STATS_REFRESH_INTERVAL", "600"))     #Seconds between background /stats snapshot refreshes
+
+
+class Notify():
+  GLOBAL_RATE = float(os.getenv("NOTIFY_RATE", "25"))                     #Messages/sec across all chats, Telegram allows ~30
+  PER_CHAT_INTERVAL = float(os.getenv("NOTIFY_CHAT_INTERVAL", "1"))       #Min seconds between two messages to the same chat
+  WORKERS = int(os.getenv("NOTIFY_WORKERS", "10"))
+  MAX_RETRIES = int(os.getenv("NOTIFY_MAX_RETRIES", "5"))                 #FloodWait retries before a message is given up
+  BROADCAST_BATCH = int(os.getenv("BROADCAST_BATCH", "200"))              #Users per broadcast checkpoint
+  DEFAULT_MODE = os.getenv("NOTIFY_DEFAULT_MODE", "instant")             #"instant" or "digest" for users who didn't pick one with /notify
+  DIGEST_WINDOW = int(os.getenv("DIGEST_WINDOW", "900"))                  #Seconds price changes are collected into one digest, 0 = one per check run
+  DIGEST_PAGE_SIZE = 8                                                    #Products per digest page
 
   
 class Server():
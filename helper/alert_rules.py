@@ -0,0 +1,75 @@
+import bisect
+
+from helper.database import users
+
+# A user's rules live on their user document as
+#   alert_rules: [{"product_id": ..., "type": "drops" | "pct" | "target", "value": ...}]
+# Trackings without a rule are alerted on every price change.
+RULE_TYPES = ("drops", "pct", "target")
+
+
+def describe_rule(rule: dict, currency: str = "") -> str:
+    if not rule:
+        return "🔔 Any price change"
+    if rule["type"] == "drops":
+        return "📉 Price drops only"
+    if rule["type"] == "pct":
+        return f"📉 Drops of {rule['value']:g}% or more"
+    return f"🎯 Price at or below {currency}{rule['value']}"
+
+
+async def get_rule(user_id, product_id: str) -> dict | None:
+    user_doc = await users.find_one(
+        {"user_id": str(user_id), "alert_rules.product_id": product_id},
+        {"alert_rules.$": 1}
+    )
+    return user_doc["alert_rules"][0] if user_doc else None
+
+
+async def set_rule(user_id, product_id: str, rule_type: str = None, value: float = None):
+    """Replaces the user's rule for `product_id`; no `rule_type` means alert on any change."""
+    new_rule = [{"product_id": product_id, "type": rule_type, "value": value}] if rule_type else []
+    # One pipeline update, so concurrent edits can't leave two rules for a product.
+    await users.update_one({"user_id": str(user_id)}, [{"$set": {"alert_rules": {"$concatArrays": [
+        {"$filter": {"input": {"$ifNull": ["$alert_rules", []]}, "cond": {"$ne": ["$$this.product_id", product_id]}}},
+        {"$literal": new_rule},
+    ]}}}])
+
+
+class ThresholdIndex:
+    """
+    The trackers of one product, bucketed by alert rule. Rules with a
+    threshold are kept sorted, so matching a new price is two bisects plus
+    the matched users, however many trackers the product has.
+    """
+
+    def __init__(self, user_ids: list, rules: list = ()):
+        ruled = {rule["user_id"]: rule for rule in rules}
+        self.users = user_ids
+        self.any_change = [user_id for user_id in user_ids if user_id not in ruled]
+        self.drops = [user_id for user_id, rule in ruled.items() if rule["type"] == "drops"]
+
+        pct = sorted((float(rule["value"]), user_id) for user_id, rule in ruled.items() if rule["type"] == "pct")
+        self.pct_thresholds = [threshold for threshold, _ in pct]
+        self.pct_users = [user_id for _, user_id in pct]
+
+        targets = sorted((float(rule["value"]), user_id) for user_id, rule in ruled.items() if rule["type"] == "target")
+        self.targets = [target for target, _ in targets]
+        self.target_users = [user_id for _, user_id in targets]
+
+    def __len__(self):
+        return len(self.users)
+
+    def match(self, old_price: int, new_price: int) -> list:
+        """The users whose rule is satisfied by a move from `old_price` to `new_price`."""
+        if not new_price or new_price == old_price:
+            return []
+        matched = list(self.any_change)
+        if old_price and new_price < old_price:
+            drop_pct = (old_price - new_price) / old_price * 100
+            matched += self.drops
+            # Minimum drop <= this drop.
+            matched += self.pct_users[:bisect.bisect_right(self.pct_thresholds, drop_pct)]
+            # Target >= the new price.
+            matched += self.target_users[bisect.bisect_left(self.targets, new_price):]
+        return matched
@@ -0,0 +1,189 @@
+import asyncio
+import time
+import secrets
+import logging
+from datetime import datetime
+
+from pyrogram import Client
+from pyrogram.types import Message
+from pyrogram.errors import InputUserDeactivated, UserDeactivated, UserIsBlocked, MessageNotModified
+
+from config import Notify
+from helper.database import users, broadcasts
+from helper.dispatcher import dispatcher
+from helper.price_checker import format_duration
+
+logger = logging.getLogger(__name__)
+
+# broadcast_id -> asyncio.Task of the broadcasts running in this process
+running_broadcasts = {}
+
+
+def _status_text(doc: dict, speed: float) -> str:
+    c = doc["counters"]
+    remaining = max(0, doc["total"] - c["processed"])
+    eta = format_duration(remaining / speed) if speed > 0 else "N/A"
+    verb = "Broadcasting" if doc["mode"] == "copy" else "Forwarding"
+    return (
+        f"📢 {verb}... `#{doc['_id']}`\n"
+        f"✅ Sent: `{c['success']}`\n"
+        f"❌ Failed: `{c['failed']}`\n"
+        f"👾 Blocked: `{c['blocked']}`\n"
+        f"👻 Deactivated: `{c['deactivated']}`\n"
+        f"📊 Processed: `{c['processed']}/{doc['total']}` users\n"
+        f"⚡️ Speed: `{speed:.1f}` msg/s | ⏳ ETA: `{eta}`"
+    )
+
+
+def _final_text(doc: dict) -> str:
+    c = doc["counters"]
+    verb = "sent" if doc["mode"] == "copy" else "forwarded"
+    header = "🛑 Broadcast cancelled." if doc["status"] == "cancelled" else "✅ Broadcast finished."
+    return (
+        f"{header} `#{doc['_id']}`\n\n"
+        f"✅ Successfully {verb} to `{c['success']}` users.\n"
+        f"❌ Failed to send to `{c['failed']}` users.\n"
+        f"👾 Removed `{c['blocked']}` blocked users\n"
+        f"👻 Removed `{c['deactivated']}` deactivated users."
+    )
+
+
+def _send(client: Client, doc: dict, chat_id: int):
+    if doc["mode"] == "forward":
+        return lambda: client.forward_messages(chat_id, doc["from_chat_id"], doc["message_id"])
+    return lambda: client.copy_message(chat_id, doc["from_chat_id"], doc["message_id"])
+
+
+async def create_broadcast(client: Client, mode: str, source: Message, status_msg: Message) -> str:
+    """Stores a new broadcast checkpoint and starts sending it in the background."""
+    broadcast_id = secrets.token_hex(4)
+    await broadcasts.insert_one({
+        "_id": broadcast_id,
+        "mode": mode,
+        "from_chat_id": source.chat.id,
+        "message_id": source.id,
+        "status": "running",
+        "last_user_oid": None,
+        "total": await users.estimated_document_count(),
+        "counters": {"success": 0, "failed": 0, "blocked": 0, "deactivated": 0, "processed": 0},
+        "status_chat_id": status_msg.chat.id,
+        "status_message_id": status_msg.id,
+        "created_at": datetime.now(),
+    })
+    start_broadcast(client, broadcast_id)
+    return broadcast_id
+
+
+def start_broadcast(client: Client, broadcast_id: str) -> bool:
+    """Runs (or resumes) a stored broadcast unless it is already running here."""
+    task = running_broadcasts.get(broadcast_id)
+    if task and not task.done():
+        return False
+    running_broadcasts[broadcast_id] = asyncio.create_task(run_broadcast(client, broadcast_id))
+    return True
+
+
+async def cancel_broadcast(broadcast_id: str) -> bool:
+    """Marks a broadcast as cancelled; a running one stops after its current batch."""
+    result = await broadcasts.update_one(
+        {"_id": broadcast_id, "status": {"$in": ["running", "interrupted"]}},
+        {"$set": {"status": "cancelled"}}
+    )
+    return result.modified_count > 0
+
+
+async def latest_broadcast(statuses: list) -> dict | None:
+    return await broadcasts.find_one({"status": {"$in": statuses}}, sort=[("created_at", -1)])
+
+
+async def run_broadcast(client: Client, broadcast_id: str):
+    """
+    Sends a stored broadcast to every user after its checkpoint, one batch at a
+    time. Each batch is pushed through the shared dispatcher, dead users are
+    removed with one delete_many and the checkpoint is saved before the next batch.
+    """
+    doc = await broadcasts.find_one({"_id": broadcast_id})
+    if not doc or doc["status"] not in ("running", "interrupted"):
+        return
+    await broadcasts.update_one({"_id": broadcast_id}, {"$set": {"status": "running"}})
+    doc["status"] = "running"
+
+    counters = doc["counters"]
+    started_at = time.monotonic()
+    processed_at_start = counters["processed"]
+
+    query = {"_id": {"$gt": doc["last_user_oid"]}} if doc.get("last_user_oid") else {}
+    cursor = users.find(query, {"user_id": 1}).sort("_id", 1).batch_size(Notify.BROADCAST_BATCH)
+
+    try:
+        batch = []
+        async for user_doc in cursor:
+            batch.append(user_doc)
+            if len(batch) < Notify.BROADCAST_BATCH:
+                continue
+            if not await _send_batch(client, doc, batch):
+                break
+            batch = []
+            speed = (counters["processed"] - processed_at_start) / (time.monotonic() - started_at)
+            await _edit_status(client, doc, _status_text(doc, speed))
+        else:
+            if batch:
+                await _send_batch(client, doc, batch)
+            if doc["status"] == "running":
+                doc["status"] = "done"
+                await broadcasts.update_one({"_id": broadcast_id}, {"$set": {"status": "done", "finished_at": datetime.now()}})
+
+        await _edit_status(client, doc, _final_text(doc))
+    except asyncio.CancelledError:
+        await broadcasts.update_one({"_id": broadcast_id}, {"$set": {"status": "interrupted"}})
+        raise
+    except Exception as e:
+        logger.error(f"Broadcast {broadcast_id} stopped: {e}", exc_info=True)
+        await broadcasts.update_one({"_id": broadcast_id}, {"$set": {"status": "interrupted"}})
+    finally:
+        running_broadcasts.pop(broadcast_id, None)
+
+
+async def _send_batch(client: Client, doc: dict, batch: list) -> bool:
+    """Sends one batch and checkpoints it. Returns False if the broadcast was cancelled."""
+    counters = doc["counters"]
+    valid = [u for u in batch if u.get("user_id")]
+    futures = [dispatcher.submit(int(u["user_id"]), _send(client, doc, int(u["user_id"]))) for u in valid]
+    results = await asyncio.gather(*futures, return_exceptions=True)
+
+    dead_user_ids = []
+    for user_doc, result in zip(valid, results):
+        if not isinstance(result, Exception):
+            counters["success"] += 1
+        elif isinstance(result, (InputUserDeactivated, UserDeactivated)):
+            counters["deactivated"] += 1
+            dead_user_ids.append(user_doc["user_id"])
+        elif isinstance(result, UserIsBlocked):
+            counters["blocked"] += 1
+            dead_user_ids.append(user_doc["user_id"])
+        else:
+            counters["failed"] += 1
+            logger.warning(f"Broadcast {doc['_id']} failed for {user_doc['user_id']}: {result}")
+    counters["processed"] += len(batch)
+
+    if dead_user_ids:
+        await users.delete_many({"user_id": {"$in": dead_user_ids}})
+
+    updated = await broadcasts.find_one_and_update(
+        {"_id": doc["_id"]},
+        {"$set": {"last_user_oid": batch[-1]["_id"], "counters": counters, "updated_at": datetime.now()}},
+        projection={"status": 1},
+    )
+    if updated and updated["status"] == "cancelled":
+        doc["status"] = "cancelled"
+        return False
+    return True
+
+
+async def _edit_status(client: Client, doc: dict, text: str):
+    try:
+        await client.edit_message_text(doc["status_chat_id"], doc["status_message_id"], text)
+    except MessageNotModified:
+        pass
+    except Exception as e:
+        logger.warning(f"Could not update broadcast status message: {e}")
@@ -0,0 +1,52 @@
+import time
+import logging
+
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+
+def changed_fields(current_doc: dict, new_values: dict) -> dict:
+    """Returns only the entries of `new_values` that differ from `current_doc`."""
+    return {key: value for key, value in new_values.items() if current_doc.get(key) != value}
+
+
+class BulkWriter:
+    """
+    Buffers write operations for one collection and sends them as unordered
+    bulk_writes, flushing whenever `batch_size` ops are queued or
+    `flush_interval` seconds have passed since the last flush.
+    """
+
+    def __init__(self, collection, batch_size: int = 500, flush_interval: float = 5.0):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._ops = []
+        self._last_flush = time.monotonic()
+        self.written = 0
+        self.batches = 0
+        self.errors = 0
+
+    async def add(self, op):
+        self._ops.append(op)
+        if len(self._ops) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+            await self.flush()
+
+    async def flush(self):
+        ops, self._ops = self._ops, []
+        self._last_flush = time.monotonic()
+        if not ops:
+            return
+
+        try:
+            result = await self.collection.bulk_write(ops, ordered=False)
+            self.written += result.modified_count + result.upserted_count + result.inserted_count
+        except BulkWriteError as e:
+            self.errors += len(e.details.get("writeErrors", []))
+            logger.error(f"Bulk write to '{self.collection.name}' had errors: {e.details.get('writeErrors', [])[:3]}")
+        except Exception as e:
+            self.errors += len(ops)
+            logger.error(f"Bulk write of {len(ops)} ops to '{self.collection.name}' failed: {e}", exc_info=True)
+        finally:
+            self.batches += 1
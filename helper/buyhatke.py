@@ -0,0 +1,175 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+import httpx
+
+from config import Checker, Resilience
+from helper import metrics
+from helper.resilience import CircuitBreaker, RetryBudget, is_transient, backoff_delay
+
+logger = logging.getLogger(__name__)
+
+API_ENDPOINT = "https://e-com-price-tracker-lemon.vercel.app/buyhatke"
+
+# Query parameters that only carry tracking/affiliate data and never change the product.
+TRACKING_PARAMS = {"tag", "ref", "ref_", "affid", "affExtParam1", "affExtParam2", "cmpid", "lid", "marketplace", "srno", "otracker", "fm", "iid", "ssid", "qH"}
+
+
+def cache_key(product_url: str) -> str:
+    """Normalized product URL: lower-case host without 'www.', no fragment, no tracking params."""
+    parts = urlsplit(product_url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    params = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=False)
+        if k not in TRACKING_PARAMS and not k.startswith("utm_")
+    )
+    query = f"?{urlencode(params)}" if params else ""
+    return f"{host}{parts.path.rstrip('/')}{query}"
+
+
+class _FetchAbandoned(Exception):
+    """The caller running a shared fetch was cancelled; its waiters fetch for themselves."""
+
+
+class LookupCache:
+    """
+    TTL + LRU cache of API responses with single-flight loading: while a key is
+    being fetched, other callers for the same key await that fetch instead of
+    starting their own.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get(self, key: str, max_age: float = None):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, data = entry
+        if time.monotonic() - stored_at > (self.ttl if max_age is None else max_age):
+            return None
+        self._entries.move_to_end(key)
+        return data
+
+    def put(self, key: str, data):
+        self._entries[key] = (time.monotonic(), data)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_fetch(self, key: str, fetch, max_age: float = None, cacheable=None):
+        """Returns a fresh cached value for `key` or the result of `fetch()`, sharing in-flight fetches."""
+        data = self.get(key, max_age)
+        if data is not None:
+            self.hits += 1
+            metrics.lookup_cache_events.inc(result="hit")
+            return data
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            metrics.lookup_cache_events.inc(result="coalesced")
+            try:
+                return await asyncio.shield(future)
+            except _FetchAbandoned:
+                return await self.get_or_fetch(key, fetch, max_age, cacheable)
+
+        self.misses += 1
+        metrics.lookup_cache_events.inc(result="miss")
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            data = await fetch()
+        except asyncio.CancelledError:
+            # Only this caller was cancelled, not the lookup the others are waiting for.
+            future.set_exception(_FetchAbandoned())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Mark as retrieved when nobody else was waiting.
+            raise
+        else:
+            if cacheable is None or cacheable(data):
+                self.put(key, data)
+            future.set_result(data)
+            return data
+        finally:
+            self._inflight.pop(key, None)
+
+
+lookup_cache = LookupCache(Checker.LOOKUP_CACHE_TTL, Checker.LOOKUP_CACHE_SIZE)
+
+
+# Shared by every lookup, so a down endpoint is detected once for all callers.
+upstream_breaker = CircuitBreaker("buyhatke", Resilience.BREAKER_THRESHOLD, Resilience.BREAKER_RESET)
+metrics.circuit_open.set_function(lambda: int(upstream_breaker.state != "closed"))
+
+
+async def lookup_product(http_client: httpx.AsyncClient, product_url: str, max_age: float = None,
+                         timeout: float = None, retry_budget: RetryBudget = None) -> dict:
+    """
+    Returns the buyhatke API response for a product URL. Fresh responses are
+    served from the cache and concurrent lookups of the same URL share one
+    request. HTTP and JSON errors propagate like a plain `client.get` would;
+    while the endpoint is down CircuitOpenError is raised without a request.
+    Transient errors are retried with jittered backoff as long as
+    `retry_budget` allows.
+    """
+    async def request():
+        started = time.monotonic()
+        outcome = "error"
+        try:
+            response = await http_client.get(
+                API_ENDPOINT,
+                params={"product_url": product_url},
+                timeout=timeout or Checker.API_TIMEOUT
+            )
+            outcome = str(response.status_code)
+            response.raise_for_status()
+            return response.json()
+        except httpx.TimeoutException:
+            outcome = "timeout"
+            raise
+        finally:
+            metrics.api_latency.observe(time.monotonic() - started, outcome=outcome)
+
+    async def fetch():
+        attempt = 0
+        while True:
+            upstream_breaker.before_call()
+            try:
+                data = await request()
+            except Exception as e:
+                if not is_transient(e):
+                    upstream_breaker.record_success()
+                    raise
+                upstream_breaker.record_failure()
+                attempt += 1
+                if attempt >= Resilience.MAX_ATTEMPTS or retry_budget is None or not retry_budget.try_spend():
+                    raise
+                await asyncio.sleep(backoff_delay(attempt, Resilience.RETRY_BASE_DELAY, Resilience.RETRY_MAX_DELAY))
+            except BaseException:
+                upstream_breaker.release()
+                raise
+            else:
+                upstream_breaker.record_success()
+                return data
+
+    return await lookup_cache.get_or_fetch(
+        cache_key(product_url),
+        fetch,
+        max_age=max_age,
+        cacheable=lambda data: isinstance(data, dict) and "error" not in data and "detail" not in data,
+    )
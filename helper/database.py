@@ -1,15 +1,31 @@
 
-from pymongo import MongoClient
+from pymongo import AsyncMongoClient, IndexModel, ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure, DuplicateKeyError
 import logging
+from datetime import datetime
 from config import Telegram, Db
+from helper.profiling import db_commands
 
 
 
+# Every query in the bot goes through this async client, so a slow query only
+# suspends its own coroutine instead of blocking the event loop.
+client = AsyncMongoClient(
+    Db.MONGO_URI,
+    maxPoolSize=Db.POOL_SIZE,
+    minPoolSize=Db.MIN_POOL_SIZE,
+    event_listeners=[db_commands],
+)
+db = client[Db.DB_NAME]
 
-client = MongoClient(Db.MONGO_URI)
-
-users = client[Db.DB_NAME]['users']
-products = client[Db.DB_NAME]['products']
+users = db['users']
+products = db['products']
+broadcasts = db['broadcasts']
+price_history = db['price_history']
+image_cache = db['image_cache']
+pending_tracks = db['pending_tracks']
+leases = db['leases']
+digests = db['digests']
 
 logging.basicConfig(
     level=logging.WARNING,
@@ -21,6 +37,99 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 
+# Every index the bot's queries rely on, created by ensure_indexes() at startup.
+# Names are left to MongoDB so indexes that already exist are matched as-is.
+INDEXES = {
+    "users": [
+        IndexModel([("user_id", ASCENDING)], unique=True),                  # already_db, trackings lists, $push/$pull
+        IndexModel([("trackings", ASCENDING)]),                             # trackers of a product chunk, dangling-ref cleanup
+    ],
+    "products": [
+        IndexModel([("product_key", ASCENDING)], unique=True),              # one shared document per product
+        IndexModel([("next_check_at", ASCENDING)]),                         # scheduler's due queue
+    ],
+    "price_history": [
+        IndexModel([("product_id", ASCENDING), ("day", ASCENDING)]),
+    ],
+    "broadcasts": [
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING)]),    # latest resumable broadcast
+    ],
+    "image_cache": [
+        IndexModel([("used_at", ASCENDING)], expireAfterSeconds=30 * 24 * 3600),  # forget file_ids unused for 30 days
+    ],
+    "pending_tracks": [
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+    "digests": [
+        IndexModel([("user_id", ASCENDING)], unique=True, partialFilterExpression={"status": "open"}),  # one open digest per user
+        IndexModel([("status", ASCENDING), ("opened_at", ASCENDING)]),      # digests whose window is over
+        IndexModel([("sent_at", ASCENDING)], expireAfterSeconds=7 * 24 * 3600),  # keep sent pages browsable for a week
+    ],
+    "leases": [
+        IndexModel([("owner", ASCENDING)]),
+        IndexModel([("expires_at", ASCENDING)]),
+    ],
+}
+
+# Filters (and sorts) the bot sends, with placeholder values, for audit_query_plans().
+# Lookups by _id alone are left out since they always use the _id index.
+QUERY_SHAPES = [
+    ("users", {"user_id": "0"}, None),
+    ("users", {"user_id": "0", "trackings": "0"}, None),
+    ("users", {"trackings": {"$in": ["0"]}}, None),
+    ("products", {"product_key": "0"}, None),
+    ("products", {"next_check_at": {"$not": {"$gt": datetime(2000, 1, 1)}}}, {"next_check_at": 1}),
+    ("products", {"next_check_at": {"$ne": None}}, {"next_check_at": 1}),
+    ("price_history", {"product_id": "0", "day": {"$gte": datetime(2000, 1, 1)}}, {"day": 1}),
+    ("broadcasts", {"status": {"$in": ["running", "interrupted"]}}, {"created_at": -1}),
+    ("digests", {"status": "open", "opened_at": {"$lte": datetime(2000, 1, 1)}}, None),
+    ("leases", {"expires_at": {"$lte": datetime(2000, 1, 1)}}, None),
+    ("leases", {"_id": {"$in": ["0"]}, "owner": "0"}, None),
+]
+
+
+async def ensure_indexes():
+    """Creates the missing indexes of INDEXES; an index that can't be built is logged and skipped."""
+    for collection_name, models in INDEXES.items():
+        for model in models:
+            try:
+                await db[collection_name].create_indexes([model])
+            except OperationFailure as e:
+                logger.error(f"Could not create index {model.document['key']} on {collection_name}: {e}")
+
+
+def _plan_stages(plan):
+    """Yields every stage name in an explain() plan tree."""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _plan_stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from _plan_stages(value)
+
+
+async def audit_query_plans() -> list:
+    """Explains every QUERY_SHAPES query and returns (and logs) the ones that scan a whole collection."""
+    collection_scans = []
+    for collection_name, query, sort in QUERY_SHAPES:
+        command = {"find": collection_name, "filter": query}
+        if sort:
+            command["sort"] = sort
+        try:
+            explained = await db.command({"explain": command, "verbosity": "queryPlanner"})
+        except OperationFailure as e:
+            logger.warning(f"Could not explain {collection_name} {query}: {e}")
+            continue
+        if "COLLSCAN" in _plan_stages(explained.get("queryPlanner", {}).get("winningPlan", {})):
+            collection_scans.append((collection_name, query))
+            logger.warning(f"COLLSCAN: {collection_name}.find({query}) has no usable index")
+    if not collection_scans:
+        logger.info(f"Query plan audit: all {len(QUERY_SHAPES)} known queries use an index")
+    return collection_scans
+
+
 
 async def send_join_log(client, log_message):
     try:
@@ -33,28 +142,30 @@ async def send_join_log(client, log_message):
         logger.warning(f"Failed to send error log: {e}")
 
 
-def already_db(user_id):
-    user = users.find_one({"user_id": str(user_id)})
+async def already_db(user_id):
+    user = await users.find_one({"user_id": str(user_id)})
     if not user:
         return False
     return True
 
 async def add_user(user_id, client):
-    in_db = already_db(user_id)
+    in_db = await already_db(user_id)
     if in_db:
         return
     user = await client.get_users(user_id)  # Await here
     first_name = user.first_name
-    users.insert_one({"user_id": str(user_id)})        
+    try:
+        await users.insert_one({"user_id": str(user_id)})
+    except DuplicateKeyError:
+        # Two updates from a new user raced past already_db().
+        return
     return await send_join_log(client, f"#New_User\n\nNew User\n\n [{first_name}]( tg://user?id={user_id})")
 
-def remove_user(user_id):
-    in_db = already_db(user_id)
+async def remove_user(user_id):
+    in_db = await already_db(user_id)
     if not in_db:
         return 
-    return users.delete_one({"user_id": str(user_id)})
+    return await users.delete_one({"user_id": str(user_id)})
 
-def all_users():
-    user = users.find({})
-    usrs = len(list(user))
-    return usrs
+async def all_users():
+    return await users.count_documents({})
@@ -0,0 +1,164 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import BulkWriteError
+from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton, LinkPreviewOptions
+
+from config import Notify
+from helper.database import digests
+from helper.dispatcher import dispatcher
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_MODES = ("instant", "digest")
+
+# Digest lifecycle: price changes of users in digest mode are $push-ed onto
+# the user's one "open" digest. Once it is DIGEST_WINDOW old, one process
+# atomically flips it to "sent" and sends it; further changes open a new one.
+# Sent digests stay around (TTL index on sent_at) so their pages can be browsed.
+
+
+def digest_item(product_doc: dict, result: dict) -> dict:
+    """The fields of one price change a digest needs."""
+    payload = result.get("update_payload", {})
+    return {
+        "product_id": product_doc["_id"],
+        "name": payload.get("product_name") or product_doc.get("product_name", "N/A"),
+        "url": product_doc.get("url"),
+        "currency": payload.get("currency") or product_doc.get("currency", "₹"),
+        "old_price": result.get("old_price"),
+        "price": result.get("price"),
+        "delta_pct": result.get("delta_pct"),
+        "lowest": "🏆" in result.get("notification_text", ""),
+        "text": result.get("notification_text"),
+    }
+
+
+async def queue_digest_items(items_by_user: dict):
+    """Appends {user_id: [item, ...]} to each user's open digest."""
+    if not items_by_user:
+        return
+    now = datetime.now(timezone.utc)
+    ops = [
+        UpdateOne(
+            {"user_id": user_id, "status": "open"},
+            {"$push": {"items": {"$each": items}}, "$setOnInsert": {"opened_at": now}},
+            upsert=True,
+        )
+        for user_id, items in items_by_user.items()
+    ]
+    try:
+        await digests.bulk_write(ops, ordered=False)
+    except BulkWriteError as e:
+        # Two processes upserting the same user's first item: the loser now finds the open digest.
+        retry = [ops[error["index"]] for error in e.details.get("writeErrors", []) if error.get("code") == 11000]
+        if len(retry) < len(e.details.get("writeErrors", [])):
+            raise
+        await digests.bulk_write(retry, ordered=False)
+
+
+def _merged_items(items: list) -> list:
+    """One entry per product (the first old price and the latest new one), biggest drops first."""
+    merged = {}
+    for item in items:
+        if item["product_id"] in merged:
+            first = merged[item["product_id"]]
+            item = {**item, "old_price": first["old_price"], "lowest": first["lowest"] or item["lowest"]}
+            if item["old_price"]:
+                item["delta_pct"] = round((item["price"] - item["old_price"]) / item["old_price"] * 100, 2)
+        merged[item["product_id"]] = item
+    changed = [item for item in merged.values() if item["price"] != item["old_price"]]
+    return sorted(changed, key=lambda item: item["delta_pct"] if item.get("delta_pct") is not None else 0)
+
+
+def render_digest(digest: dict, page: int = 0) -> tuple:
+    """Returns (text, reply_markup) of one digest page."""
+    items = digest["items"]
+    pages = max(1, -(-len(items) // Notify.DIGEST_PAGE_SIZE))
+    page = min(max(page, 0), pages - 1)
+    start = page * Notify.DIGEST_PAGE_SIZE
+    drops = sum(1 for item in items if item["price"] < item["old_price"])
+
+    lines = [f"📬 **Price Digest:** `{len(items)}` changes, `{drops}` drops\n"]
+    buttons = []
+    for number, item in enumerate(items[start:start + Notify.DIGEST_PAGE_SIZE], start + 1):
+        arrow = "🔻" if item["price"] < item["old_price"] else "🔺"
+        delta = f" `({item['delta_pct']:+.2f}%)`" if item.get("delta_pct") is not None else ""
+        lowest = " 🏆 **Lowest ever!**" if item.get("lowest") else ""
+        lines.append(
+            f"{number}. {arrow} [{item['name'][:60]}]({item['url']})\n"
+            f"    `{item['currency']}{item['old_price']}` → **{item['currency']}{item['price']}**{delta}{lowest}"
+        )
+        if item.get("url"):
+            buttons.append([InlineKeyboardButton(f"🛍️ {number}. {item['name'][:40]}", url=item["url"])])
+
+    if pages > 1:
+        digest_id = str(digest["_id"])
+        nav = []
+        if page > 0:
+            nav.append(InlineKeyboardButton("◀️", callback_data=f"dgst_{digest_id}_{page - 1}"))
+        nav.append(InlineKeyboardButton(f"{page + 1}/{pages}", callback_data="dgst_noop"))
+        if page < pages - 1:
+            nav.append(InlineKeyboardButton("▶️", callback_data=f"dgst_{digest_id}_{page + 1}"))
+        buttons.append(nav)
+
+    return "\n".join(lines), InlineKeyboardMarkup(buttons) if buttons else None
+
+
+async def get_digest(digest_id: str, user_id) -> dict | None:
+    """A sent digest of `user_id`, with its items merged per product."""
+    if not ObjectId.is_valid(digest_id):
+        return None
+    digest = await digests.find_one({"_id": ObjectId(digest_id), "user_id": str(user_id), "status": "sent"})
+    if digest:
+        digest["items"] = _merged_items(digest["items"])
+    return digest
+
+
+async def flush_digests(client, window: int = None) -> int:
+    """Sends every open digest older than `window` seconds (default DIGEST_WINDOW); returns how many were sent."""
+    window = Notify.DIGEST_WINDOW if window is None else window
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=window)
+    futures = []
+    while True:
+        digest = await digests.find_one_and_update(
+            {"status": "open", "opened_at": {"$lte": cutoff}},
+            {"$set": {"status": "sent", "sent_at": datetime.now(timezone.utc)}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if digest is None:
+            break
+        single = len(digest["items"]) == 1
+        digest["items"] = _merged_items(digest["items"])
+        if not digest["items"]:
+            continue
+        futures.append(dispatcher.submit(int(digest["user_id"]), _digest_sender(client, digest, single)))
+
+    results = await asyncio.gather(*futures, return_exceptions=True)
+    failed = sum(1 for result in results if isinstance(result, Exception))
+    if failed:
+        logger.warning(f"{failed} of {len(results)} price digests could not be delivered")
+    return len(results) - failed
+
+
+def _digest_sender(client, digest: dict, single: bool):
+    chat_id = int(digest["user_id"])
+    if single and digest["items"][0].get("text"):
+        # A one-item digest reads better as the usual alert.
+        item = digest["items"][0]
+        return lambda: client.send_message(
+            chat_id=chat_id,
+            text=item["text"],
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("Buy Now 🛍️", url=item["url"])]]),
+            link_preview_options=LinkPreviewOptions(show_above_text=True, prefer_small_media=True),
+        )
+    text, markup = render_digest(digest)
+    return lambda: client.send_message(
+        chat_id=chat_id,
+        text=text,
+        reply_markup=markup,
+        link_preview_options=LinkPreviewOptions(is_disabled=True),
+    )
@@ -0,0 +1,163 @@
+import asyncio
+import copy
+import time
+import logging
+from collections import defaultdict
+
+from pyrogram.errors import FloodWait
+
+from config import Notify
+from helper.rate_limiter import TokenBucket
+from helper import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class DispatchStats:
+    """Delivery counters of a NotificationDispatcher since it was created."""
+
+    def __init__(self):
+        self.queued = 0
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.flood_waits = 0
+        self.flood_wait_seconds = 0
+        self.send_time = 0.0
+        self.errors = defaultdict(int)
+
+    def copy(self):
+        return copy.deepcopy(self)
+
+    def since(self, earlier):
+        """Returns the counters accumulated after the `earlier` snapshot."""
+        delta = DispatchStats()
+        for key in ("queued", "sent", "failed", "retries", "flood_waits", "flood_wait_seconds", "send_time"):
+            setattr(delta, key, getattr(self, key) - getattr(earlier, key))
+        for name, count in self.errors.items():
+            if count - earlier.errors.get(name, 0):
+                delta.errors[name] = count - earlier.errors.get(name, 0)
+        return delta
+
+
+class NotificationDispatcher:
+    """
+    Queue-backed sender for outgoing Telegram messages.
+
+    Sends are spent from a global messages-per-second budget and spaced per
+    chat. A FloodWait pauses every worker for the requested time and the
+    message is retried, so bulk senders can push at the Telegram limit
+    without losing alerts. Each submit returns a future with the send result.
+    """
+
+    def __init__(self, rate: float, per_chat_interval: float, workers: int, max_retries: int):
+        self.per_chat_interval = per_chat_interval
+        self.workers = workers
+        self.max_retries = max_retries
+        self.stats = DispatchStats()
+        self._bucket = TokenBucket(rate)
+        self._queue = None
+        self._tasks = []
+        self._chat_ready_at = {}
+        self._paused_until = 0.0
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def _ensure_started(self):
+        if self._tasks and not all(t.done() for t in self._tasks):
+            return
+        self._queue = self._queue or asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def submit(self, chat_id, send) -> asyncio.Future:
+        """
+        Queues `send`, a zero-argument callable returning the send coroutine
+        (e.g. `lambda: client.send_message(...)`). It is called again on retry.
+        """
+        self._ensure_started()
+        if len(self._chat_ready_at) > 10000:
+            now = time.monotonic()
+            self._chat_ready_at = {c: t for c, t in self._chat_ready_at.items() if t > now}
+        future = asyncio.get_running_loop().create_future()
+        self.stats.queued += 1
+        self._queue.put_nowait((chat_id, send, future, 0))
+        return future
+
+    async def send(self, chat_id, send):
+        """Queues a message and waits for its delivery result."""
+        return await self.submit(chat_id, send)
+
+    def _requeue(self, job, delay: float):
+        asyncio.get_running_loop().call_later(max(0.0, delay), self._queue.put_nowait, job)
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            chat_id, send, future, attempt = job
+            try:
+                if future.cancelled():
+                    continue
+
+                now = time.monotonic()
+                chat_ready_at = self._chat_ready_at.get(chat_id, 0.0)
+                if chat_ready_at > now:
+                    # Don't hold a worker for one slow chat, put the job back for later.
+                    self._requeue(job, chat_ready_at - now)
+                    continue
+
+                if self._paused_until > now:
+                    await asyncio.sleep(self._paused_until - now)
+
+                await self._bucket.acquire()
+                self._chat_ready_at[chat_id] = time.monotonic() + self.per_chat_interval
+
+                started = time.monotonic()
+                try:
+                    result = await send()
+                except FloodWait as e:
+                    wait = int(e.value or 1)
+                    self.stats.flood_waits += 1
+                    self.stats.flood_wait_seconds += wait
+                    metrics.flood_waits.inc()
+                    metrics.flood_wait_seconds.inc(wait)
+                    self._paused_until = max(self._paused_until, time.monotonic() + wait)
+                    if attempt < self.max_retries:
+                        self.stats.retries += 1
+                        metrics.notifications.inc(result="retried")
+                        logger.warning(f"FloodWait of {wait}s while sending to {chat_id}, retrying")
+                        self._requeue((chat_id, send, future, attempt + 1), wait)
+                    else:
+                        self.stats.failed += 1
+                        self.stats.errors[type(e).__name__] += 1
+                        metrics.notifications.inc(result="failed")
+                        if not future.done():
+                            future.set_exception(e)
+                except Exception as e:
+                    self.stats.failed += 1
+                    self.stats.errors[type(e).__name__] += 1
+                    metrics.notifications.inc(result="failed")
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    self.stats.sent += 1
+                    metrics.notifications.inc(result="sent")
+                    if not future.done():
+                        future.set_result(result)
+                finally:
+                    elapsed = time.monotonic() - started
+                    self.stats.send_time += elapsed
+                    metrics.notification_seconds.observe(elapsed)
+            finally:
+                self._queue.task_done()
+
+
+# Shared by the price checker and every other bulk sender so they spend one budget.
+dispatcher = NotificationDispatcher(
+    rate=Notify.GLOBAL_RATE,
+    per_chat_interval=Notify.PER_CHAT_INTERVAL,
+    workers=Notify.WORKERS,
+    max_retries=Notify.MAX_RETRIES,
+)
+metrics.dispatcher_queue_depth.set_function(lambda: dispatcher.pending)
@@ -0,0 +1,135 @@
+import asyncio
+import time
+import logging
+
+from helper.rate_limiter import TokenBucket, KeyedRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of a stage's input.
+_DONE = object()
+
+
+class FetchStats:
+    """Counters collected while a FetchEngine run is in progress."""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.total = 0
+        self.done = 0
+        self.rate_limit_wait = 0.0
+        self.started_at = time.monotonic()
+        self.finished_at = None
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    @property
+    def throughput(self) -> float:
+        """Completed items per second."""
+        return self.done / self.elapsed if self.elapsed > 0 else 0.0
+
+
+class FetchEngine:
+    """
+    Runs `fetch(item)` over many items with a bounded number of workers.
+    Every call first takes a token from the global bucket and from the bucket
+    of the item's key (its source), so run time is bound by the upstream quota
+    instead of a fixed per-item sleep.
+
+    Items are streamed: a producer feeds a bounded input queue and results go
+    through a bounded output queue to `on_result` as soon as they are ready,
+    so only a few items per worker are held in memory at any time.
+    """
+
+    def __init__(self, fetch, workers: int, global_rate: float = 0,
+                 key_rates: dict = None, default_key_rate: float = 0, queue_size: int = None):
+        self.fetch = fetch
+        self.workers = max(1, workers)
+        self.queue_size = queue_size or self.workers * 4
+        self.global_bucket = TokenBucket(global_rate)
+        self.limiter = KeyedRateLimiter(default_key_rate, key_rates)
+        self.stats = FetchStats(self.workers)
+        self._outbox = None
+
+    @property
+    def queue_depth(self) -> int:
+        """Results fetched but not yet taken by `on_result`."""
+        return self._outbox.qsize() if self._outbox is not None else 0
+
+    async def run(self, items, key=None, on_result=None, on_error=None):
+        """
+        Fetches all `items` (an iterable or async iterable). Each result is
+        awaited by `on_result(result)` in completion order; without a callback
+        the results are collected and returned as a list. `key(item)` selects
+        the rate-limit bucket. When `fetch` raises, `on_error(item, error)`
+        may return a result to pass on instead; otherwise the item is dropped.
+        """
+        stats = self.stats = FetchStats(self.workers)
+        inbox = asyncio.Queue(maxsize=self.workers * 2)
+        outbox = self._outbox = asyncio.Queue(maxsize=self.queue_size)
+        collected = []
+        on_result = on_result or (lambda result: _append(collected, result))
+
+        async def producer():
+            try:
+                if hasattr(items, "__aiter__"):
+                    async for item in items:
+                        stats.total += 1
+                        await inbox.put(item)
+                else:
+                    for item in items:
+                        stats.total += 1
+                        await inbox.put(item)
+            finally:
+                for _ in range(self.workers):
+                    await inbox.put(_DONE)
+
+        async def worker():
+            while True:
+                item = await inbox.get()
+                if item is _DONE:
+                    return
+
+                waited = await self.global_bucket.acquire()
+                if key is not None:
+                    waited += await self.limiter.acquire(key(item))
+                stats.rate_limit_wait += waited
+
+                try:
+                    result = await self.fetch(item)
+                except Exception as e:
+                    logger.error(f"Fetch worker failed on item: {e}", exc_info=True)
+                    result = on_error(item, e) if on_error else None
+                    if result is None:
+                        continue
+                finally:
+                    stats.done += 1
+                await outbox.put(result)
+
+        async def consumer():
+            while True:
+                result = await outbox.get()
+                if result is _DONE:
+                    return
+                try:
+                    await on_result(result)
+                except Exception as e:
+                    logger.error(f"Result handler failed: {e}", exc_info=True)
+
+        consumer_task = asyncio.create_task(consumer())
+        tasks = [asyncio.create_task(producer())] + [asyncio.create_task(worker()) for _ in range(self.workers)]
+        try:
+            await asyncio.gather(*tasks)
+            await outbox.put(_DONE)
+            await consumer_task
+        finally:
+            for task in tasks + [consumer_task]:
+                task.cancel()
+            stats.finished_at = time.monotonic()
+        return collected
+
+
+async def _append(results: list, result):
+    results.append(result)
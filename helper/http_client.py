@@ -0,0 +1,69 @@
+import time
+import logging
+from collections import defaultdict
+
+import httpx
+
+from config import Http
+
+logger = logging.getLogger(__name__)
+
+
+class HttpStats:
+    """Request count and total latency per host, recorded by the client's event hooks."""
+
+    def __init__(self):
+        self.requests = defaultdict(int)
+        self.latency = defaultdict(float)
+
+    def snapshot(self) -> dict:
+        return {host: (self.requests[host], self.latency[host]) for host in self.requests}
+
+    def avg_latency_since(self, before: dict, host: str) -> tuple:
+        """Returns (requests, average seconds) for `host` after the `before` snapshot."""
+        count_before, latency_before = before.get(host, (0, 0.0))
+        count = self.requests[host] - count_before
+        return count, (self.latency[host] - latency_before) / count if count else 0.0
+
+
+http_stats = HttpStats()
+
+
+async def _mark_start(request: httpx.Request):
+    request.extensions["started_at"] = time.monotonic()
+
+
+async def _record_latency(response: httpx.Response):
+    started_at = response.request.extensions.get("started_at")
+    if started_at is not None:
+        host = response.request.url.host
+        http_stats.requests[host] += 1
+        http_stats.latency[host] += time.monotonic() - started_at
+
+
+def create_http_client(transport: httpx.AsyncBaseTransport = None) -> httpx.AsyncClient:
+    """
+    Builds the one AsyncClient the whole bot shares, so DNS, TCP and TLS
+    setup happen once per host and keep-alive connections are reused.
+    It is attached to the Pyrogram client as `client.http` in main.py.
+    `transport` replaces the network (the benchmark passes a mock).
+    """
+    http2 = Http.HTTP2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("HTTP2 is enabled but the 'h2' package is missing, falling back to HTTP/1.1")
+            http2 = False
+
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=Http.MAX_CONNECTIONS,
+            max_keepalive_connections=Http.MAX_KEEPALIVE,
+            keepalive_expiry=Http.KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(Http.DEFAULT_TIMEOUT, connect=Http.CONNECT_TIMEOUT),
+        event_hooks={"request": [_mark_start], "response": [_record_latency]},
+        transport=transport,
+    )
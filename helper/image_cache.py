@@ -0,0 +1,32 @@
+from datetime import datetime, timezone
+
+from pymongo import UpdateOne
+
+from helper.database import image_cache
+
+
+async def cached_file_ids(image_urls: list) -> dict:
+    """Returns {image_url: telegram_file_id} for the URLs uploaded before."""
+    if not image_urls:
+        return {}
+    docs = await image_cache.find({"_id": {"$in": image_urls}}, {"file_id": 1}).to_list()
+    if docs:
+        await image_cache.update_many({"_id": {"$in": [doc["_id"] for doc in docs]}}, {"$set": {"used_at": datetime.now(timezone.utc)}})
+    return {doc["_id"]: doc["file_id"] for doc in docs}
+
+
+async def remember_file_ids(file_ids: dict):
+    """Stores the file_ids Telegram returned for freshly uploaded image URLs."""
+    if file_ids:
+        now = datetime.now(timezone.utc)
+        await image_cache.bulk_write(
+            [UpdateOne({"_id": url}, {"$set": {"file_id": file_id, "used_at": now}}, upsert=True)
+             for url, file_id in file_ids.items()],
+            ordered=False
+        )
+
+
+async def forget_file_ids(image_urls: list):
+    """Drops file_ids Telegram no longer accepts."""
+    if image_urls:
+        await image_cache.delete_many({"_id": {"$in": image_urls}})
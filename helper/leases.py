@@ -0,0 +1,151 @@
+import os
+import socket
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from datetime import timedelta
+
+from pymongo.errors import BulkWriteError
+
+from config import Workers
+from helper.database import leases, products
+from helper.scheduler import due_product_ids, utcnow
+
+logger = logging.getLogger(__name__)
+
+# Name written into every lease this process holds.
+OWNER = Workers.ID or f"{socket.gethostname()}-{os.getpid()}"
+
+DUPLICATE_KEY = 11000
+
+# A lease is one document per product, `_id` is the product id, so the unique
+# `_id` index makes a claim atomic: of several workers inserting the same
+# lease only one succeeds. Expiry times are UTC since workers may run on hosts
+# in different time zones.
+
+
+async def _reclaim_expired() -> int:
+    """Drops leases whose owner stopped renewing them (crashed or stuck worker)."""
+    result = await leases.delete_many({"expires_at": {"$lte": utcnow()}})
+    if result.deleted_count:
+        logger.warning(f"Reclaimed {result.deleted_count} expired product leases")
+    return result.deleted_count
+
+
+async def _insert_leases(candidates: list) -> list:
+    """Inserts leases for `candidates`; returns the ids this process got."""
+    now = utcnow()
+    expires_at = now + timedelta(seconds=Workers.LEASE_TTL)
+    docs = [{"_id": product_id, "owner": OWNER, "claimed_at": now, "expires_at": expires_at} for product_id in candidates]
+    lost = set()
+    try:
+        await leases.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(error.get("code") != DUPLICATE_KEY for error in errors):
+            raise
+        # Someone else claimed these between our read and insert.
+        lost = {docs[error["index"]]["_id"] for error in errors}
+    return [product_id for product_id in candidates if product_id not in lost]
+
+
+async def claim(limit: int) -> list:
+    """Leases up to `limit` due products to this process and returns their ids."""
+    if limit <= 0:
+        return []
+    await _reclaim_expired()
+
+    held = await leases.distinct("_id")
+    candidates = await due_product_ids(limit, exclude=held)
+    if not candidates:
+        return []
+    claimed = await _insert_leases(candidates)
+
+    # A product checked and released by another worker after we read the due
+    # list isn't due anymore; drop it instead of checking it twice.
+    cursor = products.find(
+        {"_id": {"$in": claimed}, "next_check_at": {"$not": {"$gt": utcnow()}}},
+        {"_id": 1}
+    )
+    still_due = {doc["_id"] async for doc in cursor}
+    await release([product_id for product_id in claimed if product_id not in still_due])
+    return [product_id for product_id in claimed if product_id in still_due]
+
+
+async def renew(product_ids: list) -> int:
+    """Extends this process' leases; returns how many were still held."""
+    if not product_ids:
+        return 0
+    result = await leases.update_many(
+        {"_id": {"$in": list(product_ids)}, "owner": OWNER},
+        {"$set": {"expires_at": utcnow() + timedelta(seconds=Workers.LEASE_TTL)}}
+    )
+    if result.matched_count < len(product_ids):
+        logger.warning(f"Lost {len(product_ids) - result.matched_count} of {len(product_ids)} product leases")
+    return result.matched_count
+
+
+async def release(product_ids: list):
+    if product_ids:
+        await leases.delete_many({"_id": {"$in": list(product_ids)}, "owner": OWNER})
+
+
+async def _heartbeat(product_ids: list):
+    """Renews `product_ids` (which may still grow) until cancelled."""
+    while True:
+        await asyncio.sleep(Workers.LEASE_TTL / 3)
+        try:
+            await renew(product_ids)
+        except Exception as e:
+            logger.error(f"Failed to renew product leases: {e}", exc_info=True)
+
+
+async def _release_quietly(product_ids: list):
+    try:
+        await release(product_ids)
+    except Exception as e:
+        # They expire on their own after LEASE_TTL.
+        logger.error(f"Failed to release product leases: {e}", exc_info=True)
+
+
+@asynccontextmanager
+async def leased_due_products(limit: int):
+    """
+    Claims due products for the duration of the block and releases them on
+    exit. Leases are renewed in the background, so a long check keeps them and
+    only a worker that stops running loses them after Workers.LEASE_TTL.
+    """
+    product_ids = await claim(limit)
+    heartbeat_task = asyncio.create_task(_heartbeat(product_ids)) if product_ids else None
+    try:
+        yield product_ids
+    finally:
+        if heartbeat_task:
+            heartbeat_task.cancel()
+        await _release_quietly(product_ids)
+
+
+@asynccontextmanager
+async def leased_products():
+    """
+    For full sweeps, which pick products regardless of their schedule: yields
+    `claim_ids(product_ids)`, which leases whichever of the given products no
+    worker holds and returns those. Everything claimed is renewed for the
+    duration of the block and released on exit.
+    """
+    held = []
+
+    async def claim_ids(product_ids: list) -> list:
+        await _reclaim_expired()
+        taken = set(await leases.distinct("_id", {"_id": {"$in": list(product_ids)}}))
+        free = [product_id for product_id in product_ids if product_id not in taken]
+        claimed = await _insert_leases(free) if free else []
+        held.extend(claimed)
+        return claimed
+
+    heartbeat_task = asyncio.create_task(_heartbeat(held))
+    try:
+        yield claim_ids
+    finally:
+        heartbeat_task.cancel()
+        await _release_quietly(held)
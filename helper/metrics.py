@@ -0,0 +1,142 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+# In-process metrics registry, rendered in the Prometheus text format by the
+# /metrics route in main.py. Metrics are updated from the bot's event loop and
+# read from the Flask thread, so every metric guards its values with a lock.
+
+REGISTRY = []
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key: tuple, extra: dict = None) -> str:
+    pairs = list(key) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for name, key, value in self._samples():
+            lines.append(f"{name}{_format_labels(key)} {value}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, function=None):
+        super().__init__(name, documentation)
+        self._function = function
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def set_function(self, function):
+        """Reads the value from `function()` at scrape time instead."""
+        self._function = function
+
+    def _samples(self):
+        if self._function is not None:
+            try:
+                return [(self.name, (), self._function())]
+            except Exception:
+                return []
+        return super()._samples()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started, **labels)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = [(key, list(counts), total, count) for key, (counts, total, count) in self._values.items()]
+        for key, counts, total, count in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(key, {'le': bound})} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, {'le': '+Inf'})} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return "\n".join(lines)
+
+
+def render_metrics() -> str:
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+# --- Bot metrics ---
+
+api_latency = Histogram("pricebot_buyhatke_request_seconds", "Latency of buyhatke API requests by outcome.")
+lookup_cache_events = Counter("pricebot_lookup_cache_total", "buyhatke lookup cache results (hit, miss, coalesced).")
+check_phase_seconds = Histogram("pricebot_price_check_phase_seconds", "Duration of run_price_check phases.", buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 1800, 3600, 7200))
+checked_products = Counter("pricebot_checked_products_total", "Products checked by status.")
+notification_seconds = Histogram("pricebot_notification_send_seconds", "Telegram send latency of dispatched messages.")
+notifications = Counter("pricebot_notifications_total", "Dispatched messages by result.")
+flood_waits = Counter("pricebot_floodwait_total", "FloodWait errors returned by Telegram.")
+flood_wait_seconds = Counter("pricebot_floodwait_seconds_total", "Seconds Telegram asked us to wait.")
+handler_seconds = Histogram("pricebot_handler_seconds", "Latency of bot handlers.")
+dispatcher_queue_depth = Gauge("pricebot_dispatcher_queue_depth", "Messages waiting in the notification dispatcher.")
+pipeline_queue_depth = Gauge("pricebot_pipeline_queue_depth", "Fetched results waiting for the diff/persist/notify stage.")
+pending_tracks_size = Gauge("pricebot_pending_tracks", "Looked-up products waiting for a Start Tracking click.")
+tracked_products = Gauge("pricebot_tracked_products", "Products in the products collection, refreshed with the stats snapshot.")
+quarantined_products = Counter("pricebot_quarantined_products_total", "Products quarantined after repeated permanent lookup errors.")
+circuit_open = Gauge("pricebot_buyhatke_circuit_open", "1 while the buyhatke circuit breaker is open or probing.")
+active_trackings = Gauge("pricebot_active_trackings", "Trackings pointing to an existing product, refreshed with the stats snapshot.")
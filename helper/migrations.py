@@ -0,0 +1,77 @@
+import logging
+
+from pymongo import UpdateOne, UpdateMany
+
+from helper.database import products, users
+from helper.product_key import canonical_product_key
+
+logger = logging.getLogger(__name__)
+
+
+async def migrate_product_keys():
+    """
+    Gives every product a canonical `product_key`, merges products that share
+    one into a single document (moving all trackings onto it), so the unique
+    index on the key can be built. Safe to run on every start.
+    """
+    # 1. Backfill keys on documents created before product_key existed. URL keys are
+    # recomputed too: earlier ones dropped the whole query string, variant params included.
+    backfill_ops = []
+    query = {"$or": [{"product_key": {"$exists": False}}, {"product_key": {"$regex": "^url:"}}]}
+    async for doc in products.find(query, {"source": 1, "url": 1, "other_details.pid": 1, "product_key": 1}):
+        key = canonical_product_key(doc.get("source"), (doc.get("other_details") or {}).get("pid"), doc.get("url"))
+        if key != doc.get("product_key"):
+            backfill_ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"product_key": key}}))
+    if backfill_ops:
+        await products.bulk_write(backfill_ops, ordered=False)
+        logger.info(f"Backfilled product_key on {len(backfill_ops)} products")
+
+    # 2. Merge duplicates onto the first document of each key.
+    duplicate_groups = await products.aggregate([
+        {"$sort": {"_id": 1}},
+        {"$group": {"_id": "$product_key", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ])
+    user_ops = []
+    removed_ids = []
+    async for group in duplicate_groups:
+        keeper, duplicates = group["ids"][0], group["ids"][1:]
+        # $addToSet and $pull on the same array can't share one update, so order matters here.
+        user_ops.append(UpdateMany({"trackings": {"$in": duplicates}}, {"$addToSet": {"trackings": keeper}}))
+        user_ops.append(UpdateMany({"trackings": {"$in": duplicates}}, {"$pull": {"trackings": {"$in": duplicates}}}))
+        removed_ids.extend(duplicates)
+
+    if user_ops:
+        await users.bulk_write(user_ops, ordered=True)
+        await products.delete_many({"_id": {"$in": removed_ids}})
+        logger.info(f"Merged {len(removed_ids)} duplicate products into {len(user_ops) // 2} shared products")
+
+
+async def merge_duplicate_users():
+    """
+    Folds users stored more than once (add_user could race before user_id was
+    unique) into their oldest document, keeping every tracking. Safe to run on
+    every start.
+    """
+    duplicate_groups = await users.aggregate([
+        {"$sort": {"_id": 1}},
+        {"$group": {
+            "_id": "$user_id",
+            "ids": {"$push": "$_id"},
+            "trackings": {"$push": {"$ifNull": ["$trackings", []]}},
+            "count": {"$sum": 1},
+        }},
+        {"$match": {"count": {"$gt": 1}}},
+    ])
+    user_ops = []
+    removed_ids = []
+    async for group in duplicate_groups:
+        keeper, duplicates = group["ids"][0], group["ids"][1:]
+        trackings = [product_id for trackings in group["trackings"] for product_id in trackings]
+        user_ops.append(UpdateOne({"_id": keeper}, {"$addToSet": {"trackings": {"$each": trackings}}}))
+        removed_ids.extend(duplicates)
+
+    if user_ops:
+        await users.bulk_write(user_ops, ordered=False)
+        await users.delete_many({"_id": {"$in": removed_ids}})
+        logger.info(f"Merged {len(removed_ids)} duplicate user documents into {len(user_ops)} users")
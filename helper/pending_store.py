@@ -0,0 +1,75 @@
+import time
+import logging
+from datetime import datetime, timedelta, timezone
+from collections import OrderedDict
+
+from config import Pending
+from helper import metrics
+from helper.database import pending_tracks as pending_tracks_collection
+
+logger = logging.getLogger(__name__)
+
+
+class PendingTrackStore:
+    """
+    Holds looked-up products until the user presses "Start Tracking".
+    Entries expire after `ttl` seconds and the in-memory map never holds more
+    than `max_entries`. With a Mongo collection, entries are also written
+    there (removed by a TTL index) so any bot process can serve the callback.
+    """
+
+    def __init__(self, ttl: int, max_entries: int, collection=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.collection = collection
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._entries:
+            key, (expires_at, _) = next(iter(self._entries.items()))
+            if expires_at > now and len(self._entries) <= self.max_entries:
+                break
+            del self._entries[key]
+
+    async def put(self, key: str, value: dict):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        self._evict()
+        if self.collection is not None:
+            try:
+                await self.collection.replace_one(
+                    {"_id": key},
+                    {"data": value, "expires_at": datetime.now(timezone.utc) + timedelta(seconds=self.ttl)},
+                    upsert=True
+                )
+            except Exception as e:
+                logger.warning(f"Could not persist pending track {key}: {e}")
+
+    async def get(self, key: str) -> dict | None:
+        entry = self._entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        self._entries.pop(key, None)
+
+        if self.collection is not None:
+            doc = await self.collection.find_one({"_id": key, "expires_at": {"$gt": datetime.now(timezone.utc)}})
+            if doc:
+                return doc["data"]
+        return None
+
+    async def pop(self, key: str):
+        self._entries.pop(key, None)
+        if self.collection is not None:
+            await self.collection.delete_one({"_id": key})
+
+
+pending_tracks = PendingTrackStore(
+    ttl=Pending.TTL,
+    max_entries=Pending.MAX_ENTRIES,
+    collection=pending_tracks_collection if Pending.USE_MONGO else None,
+)
+metrics.pending_tracks_size.set_function(lambda: len(pending_tracks))
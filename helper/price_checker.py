@@ -1,11 +1,15 @@
 import asyncio
+import time
 import re
 import httpx
 import os
 import logging
 from datetime import datetime
+from urllib.parse import urlsplit
 from collections import defaultdict
+from contextlib import nullcontext
 
+from pymongo import UpdateOne
 from pyrogram import Client
 from pyrogram.types import (
     Message,
@@ -19,8 +23,22 @@ from pyrogram.errors import (
     MessageNotModified
 )
 
-from config import Telegram
-from helper.database import products, users
+from config import Telegram, Checker, Notify, Resilience
+from helper.database import products, users, price_history
+from helper.fetch_engine import FetchEngine
+from helper.buyhatke import lookup_product, upstream_breaker, API_ENDPOINT
+from helper.resilience import CircuitOpenError, RetryBudget, is_transient
+from helper.http_client import http_stats
+from helper.bulk_writer import BulkWriter, changed_fields
+from helper.dispatcher import dispatcher
+from helper import scheduler, metrics
+from helper.price_history import history_point, price_extremes
+from helper.run_log import RunLog
+from helper.profiling import RunProfile, span
+from helper.digest import digest_item, queue_digest_items, flush_digests
+from helper.alert_rules import ThresholdIndex
+from helper.scheduler import next_schedule, postpone
+from helper.leases import leased_products
 
 # --- Configuration & Setup ---
 logger = logging.getLogger(__name__)
@@ -30,9 +48,6 @@ preview_options = LinkPreviewOptions(
     prefer_small_media=True
 )
 
-LOG_DIR = "logs"
-os.makedirs(LOG_DIR, exist_ok=True)
-LOG_FILE_PATH = os.path.join(LOG_DIR, "price_check.log")
 
 
 # --- Helper Functions ---
@@ -72,50 +87,52 @@ def format_duration(seconds: float) -> str:
         return f"{seconds}s"
 
 
-async def fetch_product_data(client: httpx.AsyncClient, product_doc: dict, log_file):
-    """Fetches and processes data for a single product using the new API structure."""
+async def fetch_product_data(client: httpx.AsyncClient, product_doc: dict, profile: RunProfile = None,
+                             retry_budget: RetryBudget = None):
+    """
+    Fetches and processes data for a single product using the new API structure.
+    Errors carry `error_kind`: "transient" (upstream trouble, retried as usual)
+    or "permanent" (the product itself is broken, counts towards quarantine).
+    """
     product_id = product_doc["_id"]
     product_url = product_doc.get("url")
-    log_file.write(f"\n🔍 Checking: {product_url}\n")
 
     if not product_url:
-        log_file.write("❌ Error: Missing URL\n")
-        return product_id, {"error": "Missing URL"}
-
-    api_url = f"https://e-com-price-tracker-lemon.vercel.app/buyhatke?product_url={product_url}"
+        return product_id, {"error": "Missing URL", "status": "error", "error_kind": "permanent"}
 
     try:
-        response = await client.get(api_url)
-        response.raise_for_status()
-        api_data = response.json()
+        # A fresh response from a user's lookup of the same link is reused.
+        with span(profile, "api_lookup"):
+            api_data = await lookup_product(client, product_url, retry_budget=retry_budget)
 
         if "error" in api_data or "detail" in api_data:
             error_msg = api_data.get("error") or api_data.get("detail")
-            log_file.write(f"❌ API Error: {error_msg}\n")
-            return product_id, {"error": error_msg, "status": "error"}
+            return product_id, {"error": error_msg, "status": "error", "error_kind": "permanent"}
 
+    except CircuitOpenError as e:
+        # Not the product's fault: try it again soon, without counting a failure.
+        return product_id, {"error": str(e), "status": "skipped"}
     except (httpx.RequestError, httpx.HTTPStatusError, ValueError) as e:
-        log_file.write(f"❌ Network/JSON Error: {e}\n")
-        return product_id, {"error": str(e), "status": "error"}
+        kind = "transient" if is_transient(e) else "permanent"
+        return product_id, {"error": str(e), "status": "error", "error_kind": kind}
 
     # Data Normalization
     product_main_data = api_data.get("dealsData", {}).get("product_data")
     currency_symbol = api_data.get("currencySymbol", "₹")
 
     if not product_main_data:
-        log_file.write("❌ Error: 'product_data' not found in API response\n")
-        return product_id, {"error": "'product_data' not found", "status": "error"}
+        return product_id, {"error": "'product_data' not found", "status": "error", "error_kind": "permanent"}
 
     new_price_int = parse_price_obj(product_main_data.get("cur_price")).get("int", 0)
     old_price_int = product_doc.get("current_price", {}).get("int", 0)
 
     # Compare prices and prepare updates
-    result = {"status": "same"}
+    result = {"status": "same", "price": new_price_int, "old_price": old_price_int}
     if new_price_int == 0 or new_price_int == old_price_int:
-        log_file.write("✅ Price Change: Nil\n")
         return product_id, result
 
     price_change_percent = ((new_price_int - old_price_int) / old_price_int) * 100 if old_price_int > 0 else 0
+    result["delta_pct"] = round(price_change_percent, 2)
 
     update_payload = {
         "product_name": product_main_data.get("name", product_doc.get("product_name")),
@@ -137,7 +154,6 @@ async def fetch_product_data(client: httpx.AsyncClient, product_doc: dict, log_f
     button = InlineKeyboardMarkup([[InlineKeyboardButton("Buy Now 🛍️", url=product_url)]])
 
     if new_price_int > old_price_int:
-        log_file.write(f"📈 Price Change: Increased by +{price_change_percent:.2f}%\n")
         result["status"] = "increased"
         result["notification_text"] = (
             f"🔺 **Price Increased!**\n\n"
@@ -147,7 +163,6 @@ async def fetch_product_data(client: httpx.AsyncClient, product_doc: dict, log_f
             f"**Change:** `+{price_change_percent:.2f}%`"
         )
     else:
-        log_file.write(f"📉 Price Change: Decreased by {price_change_percent:.2f}%\n")
         result["status"] = "decreased"
         result["notification_text"] = (
             f"✅ **Price Dropped!**\n\n"
@@ -163,8 +178,30 @@ async def fetch_product_data(client: httpx.AsyncClient, product_doc: dict, log_f
     return product_id, result
 
 
-async def save_and_send_logs(client: Client, summary_text: str, log_file_path: str):
-    """Sends the summary, then the log file if it's not empty, and finally deletes it."""
+async def save_and_send_logs(client: Client, summary_text: str, run_log: RunLog, profile: RunProfile = None):
+    """
+    Uploads the compressed run log if it has one, then sends the summary with
+    the upload time appended (the run log is sealed by then, so it can't hold
+    it). The archive stays on disk.
+    """
+    log_path = run_log.archive_path
+    with profile.phase("upload") if profile else nullcontext():
+        try:
+            if log_path and os.path.exists(log_path) and os.path.getsize(log_path) > 0:
+                truncated_note = " (truncated to fit the upload cap)" if run_log.truncated else ""
+                await client.send_document(
+                    chat_id=Telegram.LOG_CHANNEL_ID,
+                    document=log_path,
+                    caption=f"📋 Price Check Logs for {run_log.started_at.strftime('%Y-%m-%d')}: `{run_log.records}` records{truncated_note}",
+                    reply_to_message_id=Telegram.CHECKER_LOG_TOPIC,
+                )
+            else:
+                print(f"INFO: Log file '{log_path}' not sent because it is missing or empty.")
+        except Exception as e:
+            logger.error(f"Failed to send or process log file: {e}", exc_info=True)
+
+    if profile and "upload" in profile.phases:
+        summary_text += f"\n\n📤 **Log Upload:** `{profile.phases['upload']['seconds']:.2f}s`"
     try:
         await client.send_message(
             chat_id=Telegram.LOG_CHANNEL_ID,
@@ -174,27 +211,199 @@ async def save_and_send_logs(client: Client, summary_text: str, log_file_path: s
     except Exception as e:
         logger.error(f"Failed to send summary to log channel: {e}", exc_info=True)
 
+
+# Held for the whole run so a manual /check can't overlap a scheduled one.
+check_lock = asyncio.Lock()
+
+
+async def run_price_check(client: Client, manual_trigger: bool = False, status_msg: Message = None,
+                          product_ids: list = None, cleanup: bool = False) -> bool:
+    """
+    Checks product prices and notifies users. `product_ids` limits the run to
+    the given (due) products; without it every tracked product is checked.
+    Dead links are cleaned up on full runs or when `cleanup` is set.
+    Returns False if another check was already running.
+    """
+    if check_lock.locked():
+        if manual_trigger and status_msg:
+            await status_msg.edit_text("⏳ **A price check is already running.** Try again once it finishes.")
+        return False
+
+    async with check_lock:
+        await _run_price_check(client, manual_trigger, status_msg, product_ids, cleanup)
+    return True
+
+
+async def _batched(items, size: int):
+    """Groups an async iterable into lists of up to `size` items."""
+    batch = []
+    async for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def _cleanup_dangling_refs(client: Client, run_log: RunLog) -> dict:
+    """
+    Streams users with trackings in batches and pulls tracking ids whose
+    product no longer exists: one projected $in lookup per batch and bulk
+    $pull writes, so memory stays at one batch regardless of user count.
+    """
+    totals = defaultdict(int)
+    cleanup_writer = BulkWriter(users, Checker.WRITE_BATCH_SIZE, Checker.WRITE_FLUSH_INTERVAL)
+    notify_futures = []
+    notification_text = (
+        "Sorry, one of your tracked items was removed because it was no longer valid in our database.\n\n"
+        "Please use /my_trackings to verify your current list."
+    )
+
+    run_log.write("phase", name="cleanup")
+    cursor = users.find(
+        {"trackings.0": {"$exists": True}},
+        {"_id": 0, "user_id": 1, "trackings": 1}
+    ).batch_size(Checker.SCAN_BATCH_SIZE)
+
+    async for batch in _batched(cursor, Checker.SCAN_BATCH_SIZE):
+        batch_ids = list({pid for user_doc in batch for pid in user_doc["trackings"]})
+        existing_ids = {doc["_id"] async for doc in products.find({"_id": {"$in": batch_ids}}, {"_id": 1})}
+
+        for user_doc in batch:
+            user_id = user_doc.get("user_id")
+            if not user_id:
+                continue
+            totals["users"] += 1
+            totals["trackings"] += len(user_doc["trackings"])
+
+            missing_ids_for_user = [pid for pid in user_doc["trackings"] if pid not in existing_ids]
+            if not missing_ids_for_user:
+                continue
+
+            totals["missing"] += len(missing_ids_for_user)
+            run_log.write("dangling_refs", user_id=user_id, product_ids=missing_ids_for_user)
+            await cleanup_writer.add(UpdateOne(
+                {"user_id": user_id},
+                {"$pull": {"trackings": {"$in": missing_ids_for_user}}}
+            ))
+            # --- Notify Users About Cleanup ---
+            notify_futures.append(dispatcher.submit(
+                int(user_id),
+                lambda chat_id=int(user_id): client.send_message(chat_id=chat_id, text=notification_text)
+            ))
+
+    await cleanup_writer.flush()
+    if notify_futures:
+        await asyncio.gather(*notify_futures, return_exceptions=True)
+        run_log.write("cleanup_notified", users=len(notify_futures))
+    return totals
+
+
+async def _trackers_for(product_ids: list) -> tuple:
+    """
+    Returns ({product_id: ThresholdIndex}, {user_id, ...}) for one chunk of
+    products: the trackers and their alert rules grouped server-side, and
+    which of them want digests.
+    """
+    wants_digest = {"$eq": [{"$ifNull": ["$notify_mode", Notify.DEFAULT_MODE]}, "digest"]}
+    rule_of_tracking = {"$arrayElemAt": [
+        {"$filter": {"input": {"$ifNull": ["$alert_rules", []]}, "cond": {"$eq": ["$$this.product_id", "$trackings"]}}},
+        0
+    ]}
+    cursor = await users.aggregate([
+        {"$match": {"trackings": {"$in": product_ids}}},
+        {"$project": {"_id": 0, "user_id": 1, "trackings": 1, "notify_mode": 1, "alert_rules": 1}},
+        {"$unwind": "$trackings"},
+        {"$match": {"trackings": {"$in": product_ids}}},
+        {"$addFields": {"rule": rule_of_tracking}},
+        {"$group": {
+            "_id": "$trackings",
+            "users": {"$addToSet": "$user_id"},
+            "rules": {"$push": {"$cond": [
+                {"$ifNull": ["$rule", False]},
+                {"user_id": "$user_id", "type": "$rule.type", "value": "$rule.value"},
+                None
+            ]}},
+            "digest_users": {"$addToSet": {"$cond": [wants_digest, "$user_id", None]}},
+        }},
+    ])
+    trackers, digest_users = {}, set()
+    async for doc in cursor:
+        trackers[doc["_id"]] = ThresholdIndex(doc["users"], [rule for rule in doc["rules"] if rule])
+        digest_users.update(doc["digest_users"])
+    digest_users.discard(None)
+    return trackers, digest_users
+
+
+async def _all_product_ids():
+    """
+    Yields every product id except quarantined ones, paging by _id so no
+    cursor stays open during a long sweep.
+    """
+    not_quarantined = {"quarantined_until": {"$not": {"$gt": scheduler.utcnow()}}}
+    last_id = None
+    while True:
+        query = {"_id": {"$gt": last_id}, **not_quarantined} if last_id is not None else not_quarantined
+        page = await products.find(query, {"_id": 1}).sort("_id", 1).limit(Checker.SCAN_BATCH_SIZE).to_list()
+        if not page:
+            return
+        for doc in page:
+            yield doc["_id"]
+        last_id = page[-1]["_id"]
+
+
+async def _iter_check_items(product_ids: list, scan_stats: dict, profile: RunProfile = None, claim_ids=None):
+    """
+    Yields (product_doc, ThresholdIndex of its trackers, digest_user_ids) for
+    every tracked product to check, reading products and their trackers one
+    chunk at a time. Products nobody tracks are skipped and pushed to the
+    back of the schedule. With `claim_ids` (full sweeps), each chunk is
+    leased first and products a worker is checking are left to it.
+    """
+    async def given_ids():
+        for product_id in product_ids:
+            yield product_id
+
+    id_source = _all_product_ids() if product_ids is None else given_ids()
+    async for chunk in _batched(id_source, Checker.SCAN_BATCH_SIZE):
+        scan_stats["chunks"] += 1
+        if claim_ids is not None:
+            with span(profile, "scan"):
+                claimed = await claim_ids(chunk)
+            scan_stats["leased_elsewhere"] += len(chunk) - len(claimed)
+            chunk = claimed
+            if not chunk:
+                continue
+        with span(profile, "scan"):
+            trackers, digest_users = await _trackers_for(chunk)
+            product_docs = await products.find({"_id": {"$in": chunk}}).to_list()
+        untracked = []
+        for product_doc in product_docs:
+            tracker_index = trackers.get(product_doc["_id"])
+            if not tracker_index:
+                untracked.append(product_doc["_id"])
+                continue
+            scan_stats["products"] += 1
+            scan_stats["trackings"] += len(tracker_index)
+            yield product_doc, tracker_index, digest_users
+        with span(profile, "scan"):
+            await postpone(untracked)
+
+
+def peak_memory_mb() -> float:
+    """Peak resident set size of this process in MB (0 where unsupported)."""
     try:
-        if os.path.exists(log_file_path) and os.path.getsize(log_file_path) > 0:
-            await client.send_document(
-                chat_id=Telegram.LOG_CHANNEL_ID,
-                document=log_file_path,
-                caption=f"📋 Price Check Logs for {datetime.now().strftime('%Y-%m-%d')}",
-                reply_to_message_id=Telegram.CHECKER_LOG_TOPIC,
-            )
-        else:
-            print(f"INFO: Log file '{log_file_path}' not sent because it is missing or empty.")
-    except Exception as e:
-        logger.error(f"Failed to send or process log file: {e}", exc_info=True)
-    finally:
-        if os.path.exists(log_file_path):
-            os.remove(log_file_path)
+        import resource
+    except ImportError:
+        return 0.0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
 
 
-async def run_price_check(client: Client, manual_trigger: bool = False, status_msg: Message = None):
-    """Checks product prices, cleans up dead links, and notifies users."""
+async def _run_price_check(client: Client, manual_trigger: bool, status_msg: Message, product_ids: list, cleanup: bool):
     start_time = datetime.now()
     summary_text = "🤷‍♂️ No products are currently being tracked."
+    noteworthy = False
 
     if manual_trigger and status_msg:
         try:
@@ -202,154 +411,258 @@ async def run_price_check(client: Client, manual_trigger: bool = False, status_m
         except MessageNotModified:
             pass
 
-    with open(LOG_FILE_PATH, "w") as log_file:
-        log_file.write(f"*** Price Check Run Log: {start_time.strftime('%Y-%m-%d %H:%M:%S')} ***\n")
-
-        # --- Step 1: Data Aggregation, Validation, and Cleanup ---
-        product_to_users_map = defaultdict(list)
-        valid_product_ids = set()
-        missing_refs_count = 0
-        users_to_notify_for_cleanup = set()
-        
-        all_users = list(users.find({}, {"user_id": 1, "trackings": 1}))
-        users_with_trackings = {doc['user_id'] for doc in all_users if doc.get("trackings")}
-        total_active_trackings = 0
-
-        log_file.write("\n--- Database Cleanup Phase ---\n")
-        for user_doc in all_users:
-            user_id = user_doc.get("user_id")
-            tracking_ids = user_doc.get("trackings", [])
-            if not user_id or not tracking_ids:
-                continue
+    profile = RunProfile()
+    async with RunLog(start_time) as run_log:
 
-            total_active_trackings += len(tracking_ids)
-            valid_ids_for_user = []
-            missing_ids_for_user = []
-
-            for product_id in tracking_ids:
-                if products.count_documents({"_id": product_id}) > 0:
-                    valid_ids_for_user.append(product_id)
-                    product_to_users_map[product_id].append(user_id) # ✅ FIX: Changed .add to .append
-                else:
-                    missing_ids_for_user.append(product_id)
-                    log_file.write(f"Found missing ref '{product_id}' for user '{user_id}'\n")
-
-            valid_product_ids.update(valid_ids_for_user)
-
-            if missing_ids_for_user:
-                missing_refs_count += len(missing_ids_for_user)
-                users.update_one(
-                    {"user_id": user_id},
-                    {"$pull": {"trackings": {"$in": missing_ids_for_user}}}
-                )
-                users_to_notify_for_cleanup.add(user_id)
-                log_file.write(f"Removed {len(missing_ids_for_user)} refs for user '{user_id}'\n")
-        
-        # --- Step 2: Notify Users About Cleanup ---
-        if users_to_notify_for_cleanup:
-            cleanup_tasks = []
-            notification_text = (
-                "Sorry, one of your tracked items was removed because it was no longer valid in our database.\n\n"
-                "Please use /my_trackings to verify your current list."
+        # --- Step 1: Cleanup of Dangling References (streamed) ---
+        cleanup = cleanup or product_ids is None
+        if product_ids is not None:
+            summary_text = "🤷‍♂️ No tracked products were due for a check."
+        if cleanup:
+            with profile.phase("cleanup"):
+                cleanup_totals = await _cleanup_dangling_refs(client, run_log)
+        else:
+            cleanup_totals = defaultdict(int)
+        missing_refs_count = cleanup_totals["missing"]
+
+        # --- Step 2: Streaming Check Pipeline (scan → fetch → diff → persist → notify) ---
+        # Products and their trackers are read chunk by chunk and flow through bounded
+        # queues, so a change is stored and its alerts are queued as soon as it is
+        # found, and memory stays flat regardless of catalog size.
+        total_products = len(product_ids) if product_ids is not None else await products.estimated_document_count()
+        run_log.write("phase", name="check", products=total_products, scheduled=product_ids is not None)
+
+        if manual_trigger and status_msg:
+            await status_msg.edit_text(f"⚙️ **Checking up to {total_products} products...**")
+
+        scan_stats = defaultdict(int)
+        counters = defaultdict(int)
+        platform_stats = defaultdict(lambda: defaultdict(int))
+        notifications = defaultdict(int)
+        pending_notifications = set()
+        unique_users_to_notify = set()
+        digest_items = defaultdict(list)
+        dispatch_before = dispatcher.stats.copy()
+        http_before = http_stats.snapshot()
+        retry_budget = RetryBudget(Resilience.RUN_RETRY_BUDGET)
+        breaker_opened_before = upstream_breaker.times_opened
+
+        product_writer = BulkWriter(products, Checker.WRITE_BATCH_SIZE, Checker.WRITE_FLUSH_INTERVAL)
+        history_writer = BulkWriter(price_history, Checker.WRITE_BATCH_SIZE, Checker.WRITE_FLUSH_INTERVAL)
+
+        async def fetch(item):
+            product_doc, tracker_index, digest_users = item
+            started = time.monotonic()
+            _, result = await fetch_product_data(client.http, product_doc, profile, retry_budget)
+            run_log.write(
+                "check",
+                product_id=product_doc["_id"],
+                url=product_doc.get("url"),
+                source=product_doc.get("source"),
+                status=result.get("status"),
+                latency=round(time.monotonic() - started, 3),
+                old_price=result.get("old_price"),
+                new_price=result.get("price"),
+                delta_pct=result.get("delta_pct"),
+                error=result.get("error"),
+                error_kind=result.get("error_kind"),
             )
-            for user_id in users_to_notify_for_cleanup:
-                cleanup_tasks.append(client.send_message(chat_id=int(user_id), text=notification_text))
-            
-            await asyncio.gather(*cleanup_tasks, return_exceptions=True)
-            log_file.write(f"\nSent cleanup notifications to {len(users_to_notify_for_cleanup)} users.\n")
+            return product_doc, tracker_index, digest_users, result
+
+        def fetch_failed(item, error):
+            # Still reschedule the product, or it stays due and is leased again right away.
+            product_doc, tracker_index, digest_users = item
+            run_log.write("check", product_id=product_doc["_id"], status="error", error=str(error), error_kind="transient")
+            return product_doc, tracker_index, digest_users, {"status": "error", "error": str(error), "error_kind": "transient"}
+
+        def on_notification_done(future):
+            pending_notifications.discard(future)
+            if future.cancelled() or future.exception():
+                notifications["failed"] += 1
+            else:
+                notifications["sent"] += 1
+
+        async def process_result(item):
+            product_doc, trackers, digest_users, result = item
+            product_id = product_doc["_id"]
+
+            # Diff
+            counters["checked"] += 1
+            status = result.get("status", "error")
+            counters[status] += 1
+            metrics.checked_products.inc(status=status)
+            source = product_doc.get("source", "unknown").lower()
+            platform_stats[source]["checked"] += 1
+            platform_stats[source][status] += 1
+
+            # Persist
+            with profile.span("persist"):
+                changes = next_schedule(product_doc, status, len(trackers), result.get("error_kind"))
+                if changes.get("quarantined_until") and not product_doc.get("quarantined_until"):
+                    counters["quarantined"] += 1
+                    metrics.quarantined_products.inc()
+                if "update_payload" in result:
+                    changes.update(changed_fields(product_doc, result["update_payload"]))
+                await product_writer.add(UpdateOne({"_id": product_id}, {"$set": changes}))
+
+                if status == "decreased":
+                    # Read before this run's point is queued: the writer may flush it right away.
+                    extremes = await price_extremes(product_id)
+                    if extremes and result["price"] < extremes["low"]:
+                        result["notification_text"] = result["notification_text"].replace(
+                            "✅ **Price Dropped!**", "🏆 **Lowest Price Ever Tracked!**", 1
+                        )
+
+                if result.get("price"):
+                    await history_writer.add(history_point(product_id, result["price"]))
+
+            # Notify the trackers whose alert rule this change satisfies.
+            if "notification_text" in result:
+                for user_id in trackers.match(result["old_price"], result["price"]):
+                    if user_id in digest_users:
+                        digest_items[user_id].append(digest_item(product_doc, result))
+                        notifications["digested"] += 1
+                        if len(digest_items) >= Checker.WRITE_BATCH_SIZE:
+                            await queue_digest_items(dict(digest_items))
+                            digest_items.clear()
+                        continue
+                    if len(pending_notifications) >= Checker.MAX_PENDING_NOTIFICATIONS:
+                        with profile.span("notify_backpressure"):
+                            await asyncio.wait(set(pending_notifications), return_when=asyncio.FIRST_COMPLETED)
+                    unique_users_to_notify.add(user_id)
+                    platform_stats[source]["notified"] += 1
+                    notifications["queued"] += 1
+                    future = dispatcher.submit(
+                        int(user_id),
+                        lambda chat_id=int(user_id): client.send_message(
+                            chat_id=chat_id,
+                            text=result["notification_text"],
+                            reply_markup=result.get("button"),
+                            link_preview_options=preview_options
+                        )
+                    )
+                    pending_notifications.add(future)
+                    future.add_done_callback(on_notification_done)
 
+            if manual_trigger and status_msg and counters["checked"] % 10 == 0:
+                try:
+                    await status_msg.edit_text(f"⚙️ **Checking products... `({counters['checked']}/{total_products})`**")
+                except MessageNotModified:
+                    pass
+
+        engine = FetchEngine(
+            fetch=fetch,
+            workers=Checker.FETCH_WORKERS,
+            global_rate=Checker.API_RATE,
+            key_rates=Checker.SOURCE_RATE_LIMITS,
+            default_key_rate=Checker.SOURCE_RATE,
+            queue_size=Checker.PIPELINE_QUEUE_SIZE,
+        )
+        metrics.pipeline_queue_depth.set_function(lambda: engine.queue_depth)
+        # Full sweeps don't go through the due queue, so they lease their chunks to stay out of workers' way.
+        sweep_leases = leased_products() if product_ids is None else nullcontext()
+        with profile.phase("check"):
+            async with sweep_leases as claim_ids:
+                await engine.run(
+                    _iter_check_items(product_ids, scan_stats, profile, claim_ids),
+                    key=lambda item: item[0].get("source", "unknown").lower(),
+                    on_result=process_result,
+                    on_error=fetch_failed,
+                )
+                await product_writer.flush()
+                await history_writer.flush()
+        fetch_stats = engine.stats
+        api_requests, api_latency = http_stats.avg_latency_since(http_before, urlsplit(API_ENDPOINT).hostname)
+
+        # --- Step 3: Wait for Outstanding Notifications ---
+        if pending_notifications:
+            with profile.phase("notify"):
+                await asyncio.wait(set(pending_notifications))
+
+        # Digest users get this run's changes in their open digest; digests whose window is over go out now.
+        digests_sent = 0
+        try:
+            with profile.phase("digest"):
+                await queue_digest_items(dict(digest_items))
+                digests_sent = await flush_digests(client)
+        except Exception as e:
+            logger.error(f"Failed to queue or send price digests: {e}", exc_info=True)
+        notifications_sent = notifications["sent"]
+        notifications_failed = notifications["failed"]
+        dispatch_stats = dispatcher.stats.since(dispatch_before)
+        breaker_trips = upstream_breaker.times_opened - breaker_opened_before
+        noteworthy = bool(counters["increased"] or counters["decreased"] or counters["error"] or counters["skipped"])
+        run_log.write(
+            "summary",
+            counters=dict(counters),
+            notifications=dict(notifications),
+            retries=retry_budget.used,
+            breaker_trips=breaker_trips,
+            cleaned_refs=missing_refs_count,
+            throughput=round(engine.stats.throughput, 3),
+            phases={name: {k: round(v, 3) for k, v in phase.items()} for name, phase in profile.phases.items()},
+            spans={name: round(seconds, 3) for name, seconds in profile.spans.items()},
+            duration=round((datetime.now() - start_time).total_seconds(), 3),
+        )
 
-        if not valid_product_ids:
-            log_file.write("\nNo valid products found to check.\n")
+        if not counters["checked"]:
+            run_log.write("no_products")
             if manual_trigger and status_msg:
                 await status_msg.edit_text(summary_text)
         else:
-            # --- Step 3: Fetch and Process Valid Products ---
-            product_docs = {doc["_id"]: doc for doc in products.find({"_id": {"$in": list(valid_product_ids)}})}
-            log_file.write(f"\n--- Price Check Phase ({len(product_docs)} products) ---\n")
-            
-            if manual_trigger and status_msg:
-                await status_msg.edit_text(f"⚙️ **Checking {len(product_docs)} products...**")
-
-            results = []
-            async with httpx.AsyncClient(timeout=45.0) as http_client:
-                for i, doc in enumerate(product_docs.values()):
-                    await asyncio.sleep(3)
-                    product_id, result = await fetch_product_data(http_client, doc, log_file)
-                    results.append((product_id, result))
-                    if manual_trigger and status_msg and (i + 1) % 10 == 0:
-                        await status_msg.edit_text(f"⚙️ **Checking products... `({i + 1}/{len(product_docs)})`**")
-
-            # --- Step 4: Process Results and Send Price Notifications ---
-            counters = defaultdict(int)
-            platform_stats = defaultdict(lambda: defaultdict(int))
-            notification_tasks = []
-            unique_users_to_notify = set()
-
-            for product_id, result in results:
-                counters["checked"] += 1
-                status = result.get("status", "error")
-                counters[status] += 1
-                source = product_docs.get(product_id, {}).get("source", "unknown").lower()
-                platform_stats[source]["checked"] += 1
-                platform_stats[source][status] += 1
-
-                if "update_payload" in result:
-                    products.update_one({"_id": product_id}, {"$set": result["update_payload"]})
-
-                if "notification_text" in result:
-                    for user_id in product_to_users_map.get(product_id, []):
-                        unique_users_to_notify.add(user_id)
-                        platform_stats[source]["notified"] += 1
-                        notification_tasks.append(
-                            client.send_message(
-                                chat_id=int(user_id),
-                                text=result["notification_text"],
-                                reply_markup=result.get("button"),
-                                link_preview_options=preview_options
-                            )
-                        )
-            
-            sent_results = await asyncio.gather(*notification_tasks, return_exceptions=True)
-            notifications_sent = sum(1 for r in sent_results if not isinstance(r, Exception))
-            notifications_failed = len(sent_results) - notifications_sent
-
-            # --- Step 5: Generate Final Summary ---
+            # --- Step 4: Generate Final Summary ---
             end_time = datetime.now()
             total_duration = (end_time - start_time).total_seconds()
             time_taken_str = format_duration(total_duration)
             date_header = start_time.strftime("#%b%d")
             checked_count = counters['checked']
             avg_time_per_product = f"{total_duration / checked_count:.2f}s" if checked_count > 0 else "N/A"
+            active_trackings = cleanup_totals["trackings"] if cleanup else scan_stats["trackings"]
+            users_with_trackings = cleanup_totals["users"] if cleanup else "-"
 
             platform_summary_lines = []
             for platform, stats in sorted(platform_stats.items()):
                 if stats["checked"] == 0: continue
                 platform_summary_lines.append(f"🌐 **{platform.capitalize()}**: `{stats['checked']}` checked, `{stats['decreased']}` drops, `{stats['error']}` errors.")
             platform_summary_text = "\n".join(platform_summary_lines) if platform_summary_lines else "⚠️ No platform data."
+            phase_text = "\n".join(profile.phase_lines())
 
             notif_summary = (
                 f"**🔔 Price Notifications:**\n"
                 f"- Unique Users Notified: `{len(unique_users_to_notify)}`\n"
-                f"- Total Sent: `{notifications_sent}/{len(notification_tasks)}` | Failed: `{notifications_failed}`"
+                f"- Total Sent: `{notifications_sent}/{notifications['queued']}` | Failed: `{notifications_failed}`\n"
+                f"- Digest Items: `{notifications['digested']}` | Digests Sent: `{digests_sent}`\n"
+                f"- FloodWaits: `{dispatch_stats.flood_waits}` (`{dispatch_stats.flood_wait_seconds}s`) | Retries: `{dispatch_stats.retries}`"
             )
 
             summary_text = (
                 f"**{date_header} Price Check Complete!**\n\n"
                 f"📊 **Overall Summary:**\n"
+                f"- Run Type: `{'full sweep' if product_ids is None else f'scheduled ({len(product_ids)} due)'}`\n"
                 f"- Products Checked: `{checked_count}`\n"
-                f"- Active Trackings: `{total_active_trackings}`\n"
-                f"- Users with Trackings: `{len(users_with_trackings)}`\n\n"
+                f"- Active Trackings: `{active_trackings}`\n"
+                f"- Users with Trackings: `{users_with_trackings}`\n\n"
                 f"📈 **Price Changes:**\n"
                 f"- Increased: `{counters['increased']}` | Decreased: `{counters['decreased']}`\n\n"
                 f"🔍 **Per-Platform:**\n{platform_summary_text}\n\n"
                 f"{notif_summary}\n\n"
                 f"⚙️ **System Health:**\n"
-                f"- API/Scraping Errors: `{counters['error']}`\n"
+                f"- API/Scraping Errors: `{counters['error']}` | Quarantined: `{counters['quarantined']}`\n"
+                f"- Lookup Retries: `{retry_budget.used}/{retry_budget.limit}` | Circuit Trips: `{breaker_trips}` | Skipped (circuit open): `{counters['skipped']}`\n"
+                f"- DB Writes: `{product_writer.written}` in `{product_writer.batches}` batches | Failed: `{product_writer.errors}`\n"
                 f"- Cleaned Product Refs: `{missing_refs_count}`\n\n"
                 f"⏱️ **Performance:**\n"
                 f"- Avg. Time per Product: `{avg_time_per_product}`\n"
-                f"- Total Time Taken: `{time_taken_str}`"
+                f"- API Latency: `{api_latency:.2f}s` avg over `{api_requests}` requests\n"
+                f"- Fetch Throughput: `{fetch_stats.throughput:.2f}` products/s ({fetch_stats.workers} workers)\n"
+                f"- Schedule Budget Scale: `x{scheduler.budget_scale:.2f}`\n"
+                f"- Scan: `{scan_stats['chunks']}` chunks of ≤`{Checker.SCAN_BATCH_SIZE}` | Left to Workers: `{scan_stats['leased_elsewhere']}` | Peak Memory: `{peak_memory_mb():.0f} MB`\n"
+                f"- Total Time Taken: `{time_taken_str}`\n\n"
+                f"🧭 **Phases:**\n{phase_text}\n\n"
+                f"🔬 **Where Check Time Went** (summed over workers):\n"
+                f"- API Lookups: `{profile.spans['api_lookup']:.1f}s` over `{profile.span_counts['api_lookup']}` calls | Rate-Limit Wait: `{fetch_stats.rate_limit_wait:.1f}s`\n"
+                f"- Mongo Scan Reads: `{profile.spans['scan']:.1f}s` | Persist: `{profile.spans['persist']:.1f}s`\n"
+                f"- Telegram Sends: `{dispatch_stats.send_time:.1f}s` | Notify Backpressure: `{profile.spans['notify_backpressure']:.1f}s`"
             )
 
             if manual_trigger and status_msg:
@@ -359,4 +672,8 @@ async def run_price_check(client: Client, manual_trigger: bool = False, status_m
                 except Exception as e:
                     logger.error(f"Failed to edit status message: {e}", exc_info=True)
 
-    await save_and_send_logs(client, summary_text, LOG_FILE_PATH)
+    # Quiet scheduled ticks (nothing changed, no errors) are neither posted nor kept.
+    if manual_trigger or cleanup or noteworthy:
+        await save_and_send_logs(client, summary_text, run_log, profile)
+    elif run_log.archive_path and os.path.exists(run_log.archive_path):
+        os.remove(run_log.archive_path)
@@ -0,0 +1,92 @@
+import logging
+from datetime import datetime, timedelta
+
+from pymongo import UpdateOne
+
+from helper.database import price_history
+from helper.scheduler import utcnow
+
+logger = logging.getLogger(__name__)
+
+# Layout: one document per product per day, `_id` "<product_id>:<YYYYMMDD>".
+# Points are appended to two parallel int arrays, `t` (seconds since the start
+# of the day) and `p` (price), so a check adds a few bytes rather than a new
+# document. `min`, `max`, `last` and `n` are kept up to date on the bucket for
+# reads that don't need individual points. Days are UTC days, so every worker
+# puts a check into the same bucket; `day` reads back as naive UTC.
+
+
+def history_point(product_id: str, price: int, at: datetime = None) -> UpdateOne:
+    """Returns the upsert appending one price point to the product's daily bucket."""
+    at = at or utcnow()
+    day = datetime(at.year, at.month, at.day, tzinfo=at.tzinfo)
+    return UpdateOne(
+        {"_id": f"{product_id}:{day:%Y%m%d}"},
+        {
+            "$setOnInsert": {"product_id": product_id, "day": day},
+            "$push": {"t": int((at - day).total_seconds()), "p": int(price)},
+            "$min": {"min": int(price)},
+            "$max": {"max": int(price)},
+            "$set": {"last": int(price)},
+            "$inc": {"n": 1},
+        },
+        upsert=True,
+    )
+
+
+def _range_query(product_id: str, start: datetime = None, end: datetime = None) -> dict:
+    query = {"product_id": product_id}
+    if start or end:
+        query["day"] = {}
+        if start:
+            query["day"]["$gte"] = datetime(start.year, start.month, start.day)
+        if end:
+            query["day"]["$lte"] = end
+    return query
+
+
+async def get_history(product_id: str, start: datetime = None, end: datetime = None) -> list:
+    """Returns every (datetime, price) point of the product between `start` and `end`."""
+    points = []
+    cursor = price_history.find(_range_query(product_id, start, end), {"day": 1, "t": 1, "p": 1}).sort("day", 1)
+    async for bucket in cursor:
+        for offset, price in zip(bucket.get("t", []), bucket.get("p", [])):
+            at = bucket["day"] + timedelta(seconds=offset)
+            if (start is None or at >= start) and (end is None or at <= end):
+                points.append((at, price))
+    return points
+
+
+async def get_downsampled(product_id: str, days: int = 30, step_days: int = 1) -> list:
+    """
+    Returns one {"start", "min", "max", "last"} entry per `step_days` window over
+    the last `days` days (today included), built from the bucket summaries
+    without reading points. Windows are aligned to midnight of the first day.
+    """
+    today = utcnow()
+    start = datetime(today.year, today.month, today.day) - timedelta(days=days - 1)
+    windows = []
+    cursor = price_history.find(
+        _range_query(product_id, start),
+        {"day": 1, "min": 1, "max": 1, "last": 1}
+    ).sort("day", 1)
+    async for bucket in cursor:
+        window_start = bucket["day"] - timedelta(days=(bucket["day"] - start).days % step_days)
+        if windows and windows[-1]["start"] == window_start:
+            window = windows[-1]
+            window["min"] = min(window["min"], bucket["min"])
+            window["max"] = max(window["max"], bucket["max"])
+            window["last"] = bucket["last"]
+        else:
+            windows.append({"start": window_start, "min": bucket["min"], "max": bucket["max"], "last": bucket["last"]})
+    return windows
+
+
+async def price_extremes(product_id: str) -> dict | None:
+    """Returns the all-time {"low", "high"} of a product, or None without history."""
+    cursor = await price_history.aggregate([
+        {"$match": {"product_id": product_id}},
+        {"$group": {"_id": None, "low": {"$min": "$min"}, "high": {"$max": "$max"}}},
+    ])
+    result = await cursor.to_list()
+    return {"low": result[0]["low"], "high": result[0]["high"]} if result else None
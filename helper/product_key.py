@@ -0,0 +1,14 @@
+from helper.buyhatke import cache_key
+
+
+def canonical_product_key(source: str, pid: str = None, url: str = None) -> str:
+    """
+    Identity of a product independent of who tracked it or which link variant
+    they pasted: the site plus its product id, or the lookup-cache form of the
+    URL (tracking params stripped, variant params kept) when the API returned
+    no pid.
+    """
+    source = (source or "unknown").lower()
+    if pid:
+        return f"{source}:{pid}"
+    return f"url:{cache_key(url or '')}"
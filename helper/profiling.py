@@ -0,0 +1,113 @@
+import io
+import time
+import pstats
+import cProfile
+from contextlib import contextmanager, nullcontext
+from collections import defaultdict
+
+from pymongo import monitoring
+
+from helper import metrics
+
+
+class CommandStats(monitoring.CommandListener):
+    """Round trips to MongoDB and the time they took, fed by pymongo's command monitoring."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def snapshot(self) -> tuple:
+        return self.count, self.seconds
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self.count += 1
+        self.seconds += event.duration_micros / 1e6
+
+    def failed(self, event):
+        self.count += 1
+        self.seconds += event.duration_micros / 1e6
+
+
+# Attached to the Mongo client in helper/database.py.
+db_commands = CommandStats()
+
+
+class RunProfile:
+    """
+    Timing spans of one price-check run.
+
+    `phase()` times a sequential step (wall clock plus the Mongo round trips
+    made meanwhile); `span()` sums up time spent in one kind of work across
+    all concurrent tasks, e.g. every API lookup of the run.
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.spans = defaultdict(float)
+        self.span_counts = defaultdict(int)
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.monotonic()
+        db_before = db_commands.snapshot()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            db_count, db_seconds = db_commands.snapshot()
+            self.phases[name] = {
+                "seconds": elapsed,
+                "db_trips": db_count - db_before[0],
+                "db_seconds": db_seconds - db_before[1],
+            }
+            metrics.check_phase_seconds.observe(elapsed, phase=name)
+
+    @contextmanager
+    def span(self, name: str):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add(name, time.monotonic() - started)
+
+    def add(self, name: str, seconds: float):
+        self.spans[name] += seconds
+        self.span_counts[name] += 1
+
+    def phase_lines(self) -> list:
+        return [
+            f"- {name.capitalize()}: `{p['seconds']:.2f}s` | DB: `{p['db_trips']}` trips, `{p['db_seconds']:.2f}s`"
+            for name, p in self.phases.items()
+        ]
+
+
+def span(profile: RunProfile, name: str):
+    """`profile.span(name)`, or a no-op when there is no profile."""
+    return profile.span(name) if profile else nullcontext()
+
+
+async def profile_call(awaitable, top: int = 30) -> tuple:
+    """
+    Awaits `awaitable` under cProfile and returns (its result, a report of the
+    top functions by own time and by cumulative time). Everything on the event
+    loop is sampled meanwhile, so the report includes other handlers that ran
+    in parallel.
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        result = await awaitable
+    finally:
+        profiler.disable()
+
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream).strip_dirs()
+    stream.write("=== By own time ===\n")
+    stats.sort_stats(pstats.SortKey.TIME).print_stats(top)
+    stream.write("\n=== By cumulative time ===\n")
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top)
+    return result, stream.getvalue()
@@ -0,0 +1,55 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Async token bucket. Refills `rate` tokens per second up to `capacity`.
+    A rate of 0 (or less) means unlimited.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1.0) -> float:
+        """Waits until `tokens` are available and returns the seconds spent waiting."""
+        if self.rate <= 0:
+            return 0.0
+
+        waited = 0.0
+        # Holding the lock while sleeping keeps waiters in FIFO order.
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+
+
+class KeyedRateLimiter:
+    """One TokenBucket per key (e.g. per source or per host), created on first use."""
+
+    def __init__(self, default_rate: float, rates: dict = None):
+        self.default_rate = default_rate
+        self.rates = rates or {}
+        self._buckets = {}
+
+    def bucket(self, key: str) -> TokenBucket:
+        if key not in self._buckets:
+            self._buckets[key] = TokenBucket(self.rates.get(key, self.default_rate))
+        return self._buckets[key]
+
+    async def acquire(self, key: str, tokens: float = 1.0) -> float:
+        return await self.bucket(key).acquire(tokens)
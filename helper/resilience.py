@@ -0,0 +1,87 @@
+import time
+import random
+import logging
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream that is known to be down."""
+
+
+def is_transient(error: Exception) -> bool:
+    """Errors worth retrying later: network trouble, timeouts, 5xx/429 and garbled bodies."""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500 or error.response.status_code == 429
+    return isinstance(error, (httpx.TransportError, ValueError))
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Full-jitter exponential backoff: a random delay up to base * 2^attempt, capped."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    Fails fast while an upstream is down. After `failure_threshold` transient
+    failures in a row the circuit opens and calls raise CircuitOpenError;
+    once `reset_timeout` seconds have passed one probe call is let through,
+    which closes the circuit on success or reopens it on failure.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.times_opened = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    def before_call(self):
+        if self.state == "open":
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                raise CircuitOpenError(f"{self.name} circuit is open")
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._probing:
+                raise CircuitOpenError(f"{self.name} circuit is half-open, probe in flight")
+            self._probing = True
+
+    def record_success(self):
+        """The upstream answered (even with a 4xx): it is up."""
+        self._probing = False
+        self.failures = 0
+        if self.state != "closed":
+            logger.info(f"{self.name} circuit closed, upstream recovered")
+            self.state = "closed"
+
+    def record_failure(self):
+        self._probing = False
+        self.failures += 1
+        if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+            self.state = "open"
+            self._opened_at = time.monotonic()
+            self.times_opened += 1
+            logger.warning(f"{self.name} circuit opened after {self.failures} failures, pausing calls for {self.reset_timeout}s")
+
+    def release(self):
+        """The call was cancelled before it said anything about the upstream."""
+        self._probing = False
+
+
+class RetryBudget:
+    """Caps the retries of one price-check run, so a degraded upstream can't multiply its load."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+
+    def try_spend(self) -> bool:
+        if self.used >= self.limit:
+            return False
+        self.used += 1
+        return True
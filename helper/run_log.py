@@ -0,0 +1,118 @@
+import os
+import gzip
+import json
+import asyncio
+import logging
+from datetime import datetime
+
+from config import RunLogs
+
+logger = logging.getLogger(__name__)
+
+
+class RunLog:
+    """
+    Structured JSONL log of one price-check run.
+
+    `write()` only appends to an in-memory buffer; full buffers are written
+    by a background thread, so the event loop never blocks on disk. On close
+    the file is gzipped (capped at RunLogs.MAX_UPLOAD_BYTES) and kept in
+    RunLogs.DIR next to the most recent runs.
+    """
+
+    def __init__(self, started_at: datetime = None, directory: str = RunLogs.DIR):
+        self.started_at = started_at or datetime.now()
+        # The pid keeps runs of several worker processes starting in the same second apart.
+        self.run_id = f"{self.started_at.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        self.directory = directory
+        self.path = os.path.join(directory, f"{self.run_id}.jsonl")
+        self.archive_path = None
+        self.truncated = False
+        self.records = 0
+        self._buffer = []
+        self._flush_lock = asyncio.Lock()
+        self._flush_task = None
+
+    async def __aenter__(self):
+        await asyncio.to_thread(os.makedirs, self.directory, exist_ok=True)
+        self.write("run_started")
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def write(self, event: str, **fields):
+        """Queues one record; never blocks."""
+        record = {"ts": datetime.now().isoformat(timespec="milliseconds"), "event": event, **fields}
+        self._buffer.append(json.dumps(record, ensure_ascii=False, default=str))
+        self.records += 1
+        if len(self._buffer) >= RunLogs.BUFFER_RECORDS and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.create_task(self.flush())
+
+    def _append_lines(self, lines: list):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+    async def flush(self):
+        async with self._flush_lock:
+            lines, self._buffer = self._buffer, []
+            if lines:
+                await asyncio.to_thread(self._append_lines, lines)
+
+    async def close(self):
+        self.write("run_finished")
+        if self._flush_task:
+            await self._flush_task
+        await self.flush()
+        try:
+            self.archive_path, self.truncated = await asyncio.to_thread(self._archive)
+            await asyncio.to_thread(prune_runs, self.directory, RunLogs.KEEP_RUNS)
+        except Exception as e:
+            logger.error(f"Failed to archive run log {self.path}: {e}", exc_info=True)
+
+    def _compress(self, dest: str, keep=None) -> bool:
+        """Gzips the raw log into `dest`; returns True if it stopped at the size cap."""
+        with open(self.path, "r", encoding="utf-8") as src, open(dest, "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb") as gz:
+                for line in src:
+                    if keep and not keep(line):
+                        continue
+                    gz.write(line.encode("utf-8"))
+                    if raw.tell() >= RunLogs.MAX_UPLOAD_BYTES:
+                        gz.write(json.dumps({"event": "truncated", "reason": "size cap"}).encode("utf-8") + b"\n")
+                        return True
+        return False
+
+    def _archive(self) -> tuple:
+        archive = f"{self.path}.gz"
+        truncated = self._compress(archive)
+        if truncated:
+            # Too big even compressed: keep everything except unchanged-price checks.
+            truncated = self._compress(archive, keep=lambda line: '"status": "same"' not in line)
+        os.remove(self.path)
+        return archive, truncated
+
+
+def prune_runs(directory: str = RunLogs.DIR, keep: int = RunLogs.KEEP_RUNS):
+    """Deletes all but the `keep` newest archived runs."""
+    for path in list_runs(directory)[keep:]:
+        os.remove(path)
+
+
+def list_runs(directory: str = RunLogs.DIR) -> list:
+    """Archived run logs, newest first."""
+    if not os.path.isdir(directory):
+        return []
+    names = sorted((n for n in os.listdir(directory) if n.endswith(".jsonl.gz")), reverse=True)
+    return [os.path.join(directory, n) for n in names]
+
+
+def read_run(path: str, event: str = None, **filters):
+    """Yields the records of an archived run, optionally only those matching `event` and `filters`."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            if event and record.get("event") != event:
+                continue
+            if all(record.get(k) == v for k, v in filters.items()):
+                yield record
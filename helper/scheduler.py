@@ -0,0 +1,128 @@
+import math
+import time
+import logging
+from datetime import datetime, timedelta, timezone
+
+from config import Scheduler, Resilience
+from helper.database import products
+
+logger = logging.getLogger(__name__)
+
+# Smoothing factor of the per-product "price changed" moving average.
+VOLATILITY_ALPHA = 0.3
+
+# Multiplier applied to every interval so the summed check rate matches HOURLY_BUDGET.
+budget_scale = 1.0
+_budget_refreshed_at = None
+
+
+def utcnow() -> datetime:
+    """Schedule times are UTC, so workers in different time zones agree on what is due."""
+    return datetime.now(timezone.utc)
+
+
+def base_interval(volatility: float, trackers: int) -> float:
+    """Interval before budget scaling and error backoff: volatile and popular items come sooner."""
+    interval = Scheduler.BASE_INTERVAL / (1 + Scheduler.VOLATILITY_WEIGHT * volatility)
+    return interval / (1 + Scheduler.POPULARITY_WEIGHT * math.log2(1 + trackers))
+
+
+def next_schedule(product_doc: dict, status: str, trackers: int, error_kind: str = None) -> dict:
+    """
+    Returns the scheduling fields to $set on a product after it was checked
+    with `status`. Every error backs the product off exponentially; after
+    QUARANTINE_AFTER permanent errors in a row (delisted, PID not found) it
+    is quarantined for days, doubling per further failure. A "skipped"
+    check (upstream circuit open) only comes back after the breaker cooldown.
+    """
+    now = utcnow()
+    if status == "skipped":
+        retry_in = max(Resilience.BREAKER_RESET, Scheduler.MIN_INTERVAL)
+        return {"next_check_at": now + timedelta(seconds=retry_in)}
+
+    changed = status in ("increased", "decreased")
+    volatility = (1 - VOLATILITY_ALPHA) * product_doc.get("volatility", 0.0) + VOLATILITY_ALPHA * changed
+    error_streak = product_doc.get("error_streak", 0) + 1 if status == "error" else 0
+    if status != "error":
+        permanent_streak = 0
+    elif error_kind == "permanent":
+        permanent_streak = product_doc.get("permanent_error_streak", 0) + 1
+    else:
+        # Upstream trouble says nothing about the product: keep its streak as is.
+        permanent_streak = product_doc.get("permanent_error_streak", 0)
+
+    base = base_interval(volatility, trackers)
+    interval = base * budget_scale * 2 ** min(error_streak, 6)
+    interval = min(max(interval, Scheduler.MIN_INTERVAL), Scheduler.MAX_INTERVAL)
+
+    quarantined_until = None
+    if error_kind == "permanent" and permanent_streak >= Resilience.QUARANTINE_AFTER:
+        excess = permanent_streak - Resilience.QUARANTINE_AFTER
+        interval = min(Resilience.QUARANTINE_TIME * 2 ** min(excess, 10), Resilience.QUARANTINE_MAX)
+        quarantined_until = now + timedelta(seconds=interval)
+        if not product_doc.get("quarantined_until"):
+            logger.info(f"Quarantining product {product_doc.get('_id')} after {permanent_streak} permanent errors")
+
+    return {
+        "volatility": round(volatility, 4),
+        "error_streak": error_streak,
+        "permanent_error_streak": permanent_streak,
+        "quarantined_until": quarantined_until,
+        "tracker_count": trackers,
+        "base_interval": int(base),
+        "check_interval": int(interval),
+        "last_checked_at": now,
+        "next_check_at": now + timedelta(seconds=interval),
+    }
+
+
+async def refresh_budget_scale(force: bool = False) -> float:
+    """
+    Recomputes `budget_scale` from the checks/hour all products currently ask
+    for. That sums over the whole collection, and demand only drifts slowly,
+    so the result is reused for BUDGET_REFRESH seconds unless `force` is set.
+    """
+    global budget_scale, _budget_refreshed_at
+    if not force and _budget_refreshed_at is not None and time.monotonic() - _budget_refreshed_at < Scheduler.BUDGET_REFRESH:
+        return budget_scale
+    cursor = await products.aggregate([
+        {"$group": {
+            "_id": None,
+            "demand": {"$sum": {"$divide": [3600, {"$ifNull": ["$base_interval", Scheduler.BASE_INTERVAL]}]}},
+        }}
+    ])
+    result = await cursor.to_list()
+    demand = result[0]["demand"] if result else 0
+    if demand > 0 and Scheduler.HOURLY_BUDGET > 0:
+        budget_scale = demand / Scheduler.HOURLY_BUDGET
+    _budget_refreshed_at = time.monotonic()
+    return budget_scale
+
+
+async def due_product_ids(limit: int, exclude: list = None) -> list:
+    """
+    Pops the most overdue products. The next_check_at index acts as the
+    priority queue; products never scheduled (no next_check_at) come first.
+    Ids in `exclude` (e.g. leased by another worker) are skipped.
+    """
+    query = {"next_check_at": {"$not": {"$gt": utcnow()}}}
+    if exclude:
+        query["_id"] = {"$nin": list(exclude)}
+    cursor = products.find(query, {"_id": 1}).sort("next_check_at", 1).limit(limit)
+    return [doc["_id"] async for doc in cursor]
+
+
+async def seconds_until_next_due() -> float:
+    doc = await products.find_one({"next_check_at": {"$ne": None}}, {"next_check_at": 1}, sort=[("next_check_at", 1)])
+    if not doc:
+        return Scheduler.TICK
+    # Read back naive (the client isn't tz_aware) but stored as UTC.
+    wait = (doc["next_check_at"].replace(tzinfo=timezone.utc) - utcnow()).total_seconds()
+    return min(max(wait, 30), Scheduler.TICK)
+
+
+async def postpone(product_ids: list):
+    """Pushes products nobody tracks to the back of the queue."""
+    if product_ids:
+        later = utcnow() + timedelta(seconds=Scheduler.MAX_INTERVAL)
+        await products.update_many({"_id": {"$in": list(product_ids)}}, {"$set": {"next_check_at": later}})
@@ -0,0 +1,88 @@
+import time
+import asyncio
+import logging
+
+from config import Stats
+from helper.database import users, products
+from helper import metrics
+
+logger = logging.getLogger(__name__)
+
+# Latest /stats and /users numbers, refreshed in the background by stats_refresher.
+_snapshot = None
+_refresh_lock = asyncio.Lock()
+
+# Every user's trackings joined to their product (only the source is kept).
+# Trackings pointing to a deleted product drop out at the second $unwind.
+ACTIVE_TRACKINGS_PIPELINE = [
+    {"$match": {"trackings.0": {"$exists": True}}},
+    {"$project": {"_id": 0, "user_id": 1, "trackings": 1}},
+    {"$unwind": "$trackings"},
+    {"$lookup": {
+        "from": "products",
+        "localField": "trackings",
+        "foreignField": "_id",
+        "pipeline": [{"$project": {"_id": 1, "source": 1}}],
+        "as": "product",
+    }},
+    {"$unwind": "$product"},
+    {"$facet": {
+        "total": [{"$count": "count"}],
+        "sources": [
+            {"$group": {"_id": "$product._id", "source": {"$first": "$product.source"}}},
+            {"$group": {"_id": {"$ifNull": ["$source", "unknown"]}, "count": {"$sum": 1}}},
+        ],
+        "top_users": [
+            {"$group": {"_id": "$user_id", "count": {"$sum": 1}}},
+            {"$group": {"_id": None, "top": {"$topN": {"n": 10, "sortBy": {"count": -1}, "output": ["$_id", "$count"]}}}},
+        ],
+    }},
+]
+
+
+async def compute_stats() -> dict:
+    """Builds the statistics server-side; only the aggregated numbers reach Python."""
+    started = time.time()
+    total_users = await users.count_documents({})
+
+    cursor = await users.aggregate(ACTIVE_TRACKINGS_PIPELINE, allowDiskUse=True)
+    facets = (await cursor.to_list())[0]
+
+    total = facets["total"][0]["count"] if facets["total"] else 0
+    top = facets["top_users"][0]["top"] if facets["top_users"] else []
+
+    metrics.active_trackings.set(total)
+    metrics.tracked_products.set(await products.estimated_document_count())
+    return {
+        "total_users": total_users,
+        "total_active_trackings": total,
+        "source_counts": {doc["_id"]: doc["count"] for doc in facets["sources"]},
+        "top_users": [(user_id, count) for user_id, count in top],
+        "generated_at": time.time(),
+        "build_time": time.time() - started,
+    }
+
+
+async def get_stats(max_age: float = None) -> dict:
+    """Returns the cached snapshot, rebuilding it if it is missing or older than `max_age`."""
+    global _snapshot
+    max_age = Stats.REFRESH_INTERVAL * 2 if max_age is None else max_age
+    if _snapshot and time.time() - _snapshot["generated_at"] <= max_age:
+        return _snapshot
+
+    async with _refresh_lock:
+        # Another caller may have refreshed it while we waited.
+        if _snapshot and time.time() - _snapshot["generated_at"] <= max_age:
+            return _snapshot
+        _snapshot = await compute_stats()
+        return _snapshot
+
+
+async def stats_refresher():
+    """Keeps the snapshot warm so /stats and /users answer from memory."""
+    while True:
+        try:
+            await get_stats(max_age=0)
+        except Exception as e:
+            logger.error(f"Failed to refresh stats snapshot: {e}", exc_info=True)
+        await asyncio.sleep(Stats.REFRESH_INTERVAL)
@@ -1,11 +1,20 @@
+import time
 import asyncio
 import threading
 import logging
 from pyrogram import Client, idle
-from flask import Flask
-from config import Telegram, Server
+from flask import Flask, Response
+from config import Telegram, Server, Scheduler, Workers
 from helper.logger_setup import init_logger
+from helper.metrics import render_metrics
 from helper.price_checker import run_price_check
+from helper.migrations import migrate_product_keys, merge_duplicate_users
+from helper.database import ensure_indexes, audit_query_plans
+from helper.stats_snapshot import stats_refresher
+from helper.http_client import create_http_client
+from helper.scheduler import seconds_until_next_due, refresh_budget_scale
+from helper.leases import leased_due_products
+from helper.digest import flush_digests
 
 
 web_app = Flask(__name__)
@@ -16,10 +25,31 @@ def hello_world():
     return "Hello, World!"
 
 
+@web_app.route("/metrics")
+def metrics():
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
 async def price_check_runner(client: Client):
+    """Checks whatever is due, then sleeps until the next product comes due."""
+    last_cleanup = 0
     while True:
-        await run_price_check(client, manual_trigger=False)
-        await asyncio.sleep(18000)  
+        try:
+            cleanup = time.monotonic() - last_cleanup >= Scheduler.CLEANUP_INTERVAL
+            # Due products are leased, so worker.py processes can share the queue.
+            batch = Scheduler.MAX_BATCH if Workers.CHECK_IN_BOT else 0
+            async with leased_due_products(batch) as due_ids:
+                if due_ids or cleanup:
+                    await refresh_budget_scale()
+                    ran = await run_price_check(client, manual_trigger=False, product_ids=due_ids, cleanup=cleanup)
+                    if ran and cleanup:
+                        last_cleanup = time.monotonic()
+            # Digest windows run out even when nothing is due.
+            await flush_digests(client)
+            await asyncio.sleep(await seconds_until_next_due())
+        except Exception:
+            logging.exception("Price check scheduler tick failed")
+            await asyncio.sleep(Scheduler.TICK)
 
 
 def run_flask():
@@ -39,14 +69,21 @@ app = Client(
     bot_token=Telegram.BOT_TOKEN,
     plugins=dict(root="plugins"),
 )
+# Shared HTTP connection pool, handlers and the checker use it as `client.http`.
+app.http = create_http_client()
 
 
 def main():
     async def startup():
         try:
             await app.send_message(Telegram.ADMIN, "Bot restarted")
+            await migrate_product_keys()
+            await merge_duplicate_users()
+            await ensure_indexes()
+            await audit_query_plans()
             # start background task after bot is up
             asyncio.create_task(price_check_runner(app))
+            asyncio.create_task(stats_refresher())
         except Exception as e:
             print(f"Failed to send message: {e}")
 
@@ -62,6 +99,7 @@ def main():
     app.loop.run_until_complete(startup())
     idle()
     app.stop()
+    app.loop.run_until_complete(app.http.aclose())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,133 @@
+import re
+import logging
+from pyrogram import Client as app, Client, filters
+from pyrogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, ForceReply
+from pyrogram.errors import MessageNotModified
+from helper.database import products, users
+from helper.alert_rules import describe_rule, get_rule, set_rule
+
+logger = logging.getLogger(__name__)
+
+# The target price prompt ends with this tag, so the reply can be matched to its product.
+TARGET_TAG = re.compile(r"#target_([A-Za-z0-9]+)")
+
+
+async def _tracked_product(user_id, product_id: str) -> dict | None:
+    is_tracking = await users.find_one({"user_id": str(user_id), "trackings": product_id}, {"_id": 1})
+    if not is_tracking:
+        return None
+    return await products.find_one({"_id": product_id}, {"product_name": 1, "currency": 1, "current_price": 1})
+
+
+def rule_menu(product_id: str, product_doc: dict, rule: dict) -> tuple:
+    text = (
+        f"🔔 **Alert Rule**\n\n"
+        f"**{product_doc.get('product_name', 'N/A')}**\n"
+        f"**Current Price:** `{product_doc.get('currency', '')}{product_doc.get('current_price', {}).get('string', 'N/A')}`\n\n"
+        f"**Notify me on:** {describe_rule(rule, product_doc.get('currency', ''))}"
+    )
+    keyboard = InlineKeyboardMarkup([
+        [
+            InlineKeyboardButton("🔔 Any change", callback_data=f"setrule_{product_id}_any"),
+            InlineKeyboardButton("📉 Drops only", callback_data=f"setrule_{product_id}_drops"),
+        ],
+        [
+            InlineKeyboardButton(f"📉 ≥{pct}%", callback_data=f"setrule_{product_id}_pct_{pct}")
+            for pct in (5, 10, 20)
+        ],
+        [InlineKeyboardButton("🎯 Target Price", callback_data=f"asktarget_{product_id}")],
+        [InlineKeyboardButton("🔙 Back", callback_data=f"info_{product_id}")],
+    ])
+    return text, keyboard
+
+
+@app.on_callback_query(filters.regex(r"^rule_"))
+async def rule_menu_handler(client: Client, callback_query: CallbackQuery):
+    """Shows the alert rule of one tracked product."""
+    product_id = callback_query.data.split("_", 1)[1]
+    user_id = callback_query.from_user.id
+    product_doc = await _tracked_product(user_id, product_id)
+    if not product_doc:
+        await callback_query.answer("⚠️ This product is no longer tracked or does not exist.", show_alert=True)
+        return
+
+    text, keyboard = rule_menu(product_id, product_doc, await get_rule(user_id, product_id))
+    try:
+        await callback_query.message.edit_text(text, reply_markup=keyboard)
+    except MessageNotModified:
+        pass
+    await callback_query.answer()
+
+
+@app.on_callback_query(filters.regex(r"^setrule_"))
+async def set_rule_handler(client: Client, callback_query: CallbackQuery):
+    _, product_id, rule_type, *value = callback_query.data.split("_")
+    user_id = callback_query.from_user.id
+    product_doc = await _tracked_product(user_id, product_id)
+    if not product_doc:
+        await callback_query.answer("⚠️ This product is no longer tracked or does not exist.", show_alert=True)
+        return
+
+    try:
+        if rule_type == "any":
+            await set_rule(user_id, product_id)
+        else:
+            await set_rule(user_id, product_id, rule_type, float(value[0]) if value else None)
+    except Exception as e:
+        logger.error(f"DB Error saving alert rule {product_id} for user {user_id}: {e}", exc_info=True)
+        await callback_query.answer("❌ Failed to save the alert rule.", show_alert=True)
+        return
+
+    text, keyboard = rule_menu(product_id, product_doc, await get_rule(user_id, product_id))
+    try:
+        await callback_query.message.edit_text(text, reply_markup=keyboard)
+    except MessageNotModified:
+        pass
+    await callback_query.answer("✅ Alert rule saved!")
+
+
+@app.on_callback_query(filters.regex(r"^asktarget_"))
+async def ask_target_handler(client: Client, callback_query: CallbackQuery):
+    product_id = callback_query.data.split("_", 1)[1]
+    product_doc = await _tracked_product(callback_query.from_user.id, product_id)
+    if not product_doc:
+        await callback_query.answer("⚠️ This product is no longer tracked or does not exist.", show_alert=True)
+        return
+
+    await callback_query.message.reply_text(
+        f"🎯 **Target price for** {product_doc.get('product_name', 'N/A')}\n\n"
+        f"Reply to this message with the price you'd buy at, e.g. `1499`.\n\n#target_{product_id}",
+        reply_markup=ForceReply(selective=True, placeholder="Target price")
+    )
+    await callback_query.answer()
+
+
+@app.on_message(filters.private & filters.reply & filters.text & ~filters.regex(r"^/"))
+async def target_reply_handler(client: Client, message: Message):
+    """Saves the target price typed in reply to the prompt above."""
+    prompt = message.reply_to_message
+    match = TARGET_TAG.search(prompt.text or "") if prompt and prompt.from_user and prompt.from_user.is_self else None
+    if not match:
+        message.continue_propagation()
+
+    product_id = match.group(1)
+    try:
+        target = int(float(re.sub(r"[^\d.]", "", message.text)))
+    except ValueError:
+        await message.reply_text("❌ **Please send just a number**, e.g. `1499`.", quote=True)
+        return
+    if target <= 0:
+        await message.reply_text("❌ **The target price must be above zero.**", quote=True)
+        return
+
+    product_doc = await _tracked_product(message.from_user.id, product_id)
+    if not product_doc:
+        await message.reply_text("⚠️ This product is no longer tracked or does not exist.", quote=True)
+        return
+
+    await set_rule(message.from_user.id, product_id, "target", target)
+    await message.reply_text(
+        f"✅ **Target set!** You'll be notified when the price drops to "
+        f"`{product_doc.get('currency', '')}{target}` or below.",
+        quote=True
+    )
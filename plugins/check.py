@@ -1,9 +1,45 @@
+import asyncio
+from io import BytesIO
+from datetime import datetime
 from pyrogram import Client, filters
 from pyrogram.types import Message
 from helper.price_checker import run_price_check
+from helper.profiling import profile_call
 from config import Telegram
 
+# cProfile can't run twice at once.
+profile_lock = asyncio.Lock()
+
 @Client.on_message(filters.command("check") & filters.user(Telegram.ADMIN))
 async def check_product_prices(client: Client, message: Message):
+    if len(message.command) > 1 and message.command[1].lower() == "profile":
+        await profiled_check(client, message)
+        return
     status_msg = await message.reply_text("🔎 **Initializing Price Check...**")
     await run_price_check(client, manual_trigger=True, status_msg=status_msg)
+
+
+async def profiled_check(client: Client, message: Message):
+    """`/check profile`: a full check under cProfile, hot spots go to the checker log topic."""
+    if profile_lock.locked():
+        await message.reply_text("⏳ **A profiled check is already running.**")
+        return
+
+    async with profile_lock:
+        status_msg = await message.reply_text("🔬 **Initializing Profiled Price Check...**")
+        ran, report = await profile_call(run_price_check(client, manual_trigger=True, status_msg=status_msg))
+
+    if not ran:
+        # Another check held the lock, so the profile would be empty.
+        await message.reply_text("🔬 **No profile taken:** a price check was already running. Try again once it finishes.")
+        return
+
+    document = BytesIO(report.encode("utf-8"))
+    document.name = f"check-profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}.txt"
+    await client.send_document(
+        chat_id=Telegram.LOG_CHANNEL_ID,
+        document=document,
+        caption="🔬 **Price Check Profile:** top functions by own and cumulative time.",
+        reply_to_message_id=Telegram.CHECKER_LOG_TOPIC,
+    )
+    await message.reply_text("🔬 **Profile uploaded to the checker log topic.**")
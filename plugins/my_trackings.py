@@ -7,6 +7,8 @@ from pyrogram.types import (
     LinkPreviewOptions
 )
 from helper.database import products, users
+from helper.price_history import price_extremes, get_downsampled
+from helper.alert_rules import describe_rule, get_rule
 
 logger = logging.getLogger(__name__)
 
@@ -26,7 +28,7 @@ async def list_trackings_handler(client: Client, entity):
         return
 
     try:
-        user_doc = users.find_one({"user_id": str(user_id)})
+        user_doc = await users.find_one({"user_id": str(user_id)})
     except Exception as e:
         logger.error(f"DB Error fetching user trackings for user {user_id}: {e}", exc_info=True)
         text = "❌ **Error:** Could not load your tracking list due to a database issue."
@@ -46,7 +48,7 @@ async def list_trackings_handler(client: Client, entity):
     
     try:
         # Fetch product details for all tracked IDs
-        product_docs = list(products.find({"_id": {"$in": tracking_ids}}))
+        product_docs = await products.find({"_id": {"$in": tracking_ids}}).to_list()
     except Exception as e:
         logger.error(f"DB Error fetching product details for user {user_id}: {e}", exc_info=True)
         text = "❌ **Error:** Could not load product details due to a database issue."
@@ -98,7 +100,9 @@ async def product_info_handler(client: Client, callback_query: CallbackQuery):
     user_id = callback_query.from_user.id
     
     try:
-        product_doc = products.find_one({"_id": product_id, "userid": user_id})
+        # Products are shared between trackers, so ownership is checked on the user's list.
+        is_tracking = await users.find_one({"user_id": str(user_id), "trackings": product_id}, {"_id": 1})
+        product_doc = await products.find_one({"_id": product_id}) if is_tracking else None
     except Exception as e:
         logger.error(f"DB Error fetching product info {product_id} for user {user_id}: {e}", exc_info=True)
         await callback_query.answer("⚠️ An error occurred while fetching product details.", show_alert=True)
@@ -124,6 +128,25 @@ async def product_info_handler(client: Client, callback_query: CallbackQuery):
         prefer_small_media =True)
 
     
+    history_text = ""
+    try:
+        extremes = await price_extremes(product_id)
+        last_30_days = await get_downsampled(product_id, days=30, step_days=30)
+        currency = api_data.get("currency", "")
+        if extremes:
+            history_text += f"**All-Time:** Low `{currency}{extremes['low']}` | High `{currency}{extremes['high']}`\n"
+        if last_30_days:
+            month = last_30_days[-1]
+            history_text += f"**Last 30 Days:** Low `{currency}{month['min']}` | High `{currency}{month['max']}`\n"
+    except Exception as e:
+        logger.warning(f"Could not load price history for {product_id}: {e}")
+
+    try:
+        rule_text = f"**Alerts:** {describe_rule(await get_rule(user_id, product_id), api_data.get('currency', ''))}\n"
+    except Exception as e:
+        logger.warning(f"Could not load alert rule for {product_id}: {e}")
+        rule_text = ""
+
     # Construct the message caption with the hidden image link at the top
     caption = (
         f"{image_preview_link}"
@@ -131,14 +154,19 @@ async def product_info_handler(client: Client, callback_query: CallbackQuery):
         f"**Price:** ~~{api_data.get('original_price', {}).get('string', 'N/A')}~~ "
         f"→ **{api_data.get('current_price', {}).get('string', 'N/A')}** "
         f"`({api_data.get('discount_percentage', 'N/A')})`\n"
-        f"**Rating:** {api_data.get('rating', 'N/A')} ({api_data.get('reviews_count', 0)} ratings)\n\n"
+        f"**Rating:** {api_data.get('rating', 'N/A')} ({api_data.get('reviews_count', 0)} ratings)\n"
+        f"{history_text}"
+        f"{rule_text}\n"
     )
     
     keyboard = InlineKeyboardMarkup(
-        [[
-            InlineKeyboardButton("❌ Stop Tracking", callback_data=f"stp_tracking_{product_id}"),
-            InlineKeyboardButton("🔙 Back", callback_data="back_to_trackings")
-        ]]
+        [
+            [InlineKeyboardButton("🔔 Alert Rule", callback_data=f"rule_{product_id}")],
+            [
+                InlineKeyboardButton("❌ Stop Tracking", callback_data=f"stp_tracking_{product_id}"),
+                InlineKeyboardButton("🔙 Back", callback_data="back_to_trackings")
+            ]
+        ]
     )
     
 
@@ -160,9 +188,9 @@ async def stop_tracking_handler(client: Client, callback_query: CallbackQuery):
     user_id = callback_query.from_user.id
     
     try:
-        users.update_one(
+        await users.update_one(
             {"user_id": str(user_id)},
-            {"$pull": {"trackings": product_id}}
+            {"$pull": {"trackings": product_id, "alert_rules": {"product_id": product_id}}}
         )
     except Exception as e:
         logger.error(f"DB Error stopping tracking {product_id} for user {user_id}: {e}", exc_info=True)
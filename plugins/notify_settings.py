@@ -0,0 +1,83 @@
+import logging
+from pyrogram import Client as app, Client, filters
+from pyrogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, LinkPreviewOptions
+from pyrogram.errors import MessageNotModified
+from config import Notify
+from helper.database import users
+from helper.digest import NOTIFY_MODES, get_digest, render_digest
+
+logger = logging.getLogger(__name__)
+
+
+def notify_settings(mode: str) -> tuple:
+    window = f"{Notify.DIGEST_WINDOW // 60} minutes" if Notify.DIGEST_WINDOW else "each price check"
+    text = (
+        "🔔 **Price Alert Delivery**\n\n"
+        f"⚡ **Instant:** one message per price change, as soon as it's found.\n"
+        f"📬 **Digest:** all changes of {window} in one message.\n\n"
+        f"**Current:** `{mode.capitalize()}`"
+    )
+    keyboard = InlineKeyboardMarkup([[
+        InlineKeyboardButton(("✅ " if mode == "instant" else "") + "⚡ Instant", callback_data="notify_mode_instant"),
+        InlineKeyboardButton(("✅ " if mode == "digest" else "") + "📬 Digest", callback_data="notify_mode_digest"),
+    ]])
+    return text, keyboard
+
+
+@app.on_message(filters.command("notify") & filters.private)
+async def notify_command_handler(client: Client, message: Message):
+    """Shows and switches how price alerts are delivered."""
+    user_doc = await users.find_one({"user_id": str(message.from_user.id)}, {"notify_mode": 1})
+    mode = (user_doc or {}).get("notify_mode", Notify.DEFAULT_MODE)
+    text, keyboard = notify_settings(mode)
+    await message.reply_text(text, reply_markup=keyboard, quote=True)
+
+
+@app.on_callback_query(filters.regex(r"^notify_mode_"))
+async def notify_mode_handler(client: Client, callback_query: CallbackQuery):
+    mode = callback_query.data.replace("notify_mode_", "", 1)
+    if mode not in NOTIFY_MODES:
+        await callback_query.answer()
+        return
+
+    try:
+        result = await users.update_one({"user_id": str(callback_query.from_user.id)}, {"$set": {"notify_mode": mode}})
+    except Exception as e:
+        logger.error(f"DB Error saving notify mode for user {callback_query.from_user.id}: {e}", exc_info=True)
+        await callback_query.answer("❌ Could not save your choice, please try again.", show_alert=True)
+        return
+    if not result.matched_count:
+        await callback_query.answer("⚠️ Please /start the bot first.", show_alert=True)
+        return
+
+    await callback_query.answer(f"✅ Alerts will be sent as {'a digest' if mode == 'digest' else 'they happen'}.")
+    text, keyboard = notify_settings(mode)
+    try:
+        await callback_query.message.edit_text(text, reply_markup=keyboard)
+    except MessageNotModified:
+        pass
+
+
+@app.on_callback_query(filters.regex(r"^dgst_"))
+async def digest_page_handler(client: Client, callback_query: CallbackQuery):
+    """Flips through the pages of a price digest."""
+    if callback_query.data == "dgst_noop":
+        await callback_query.answer()
+        return
+
+    _, digest_id, page = callback_query.data.split("_", 2)
+    digest = await get_digest(digest_id, callback_query.from_user.id) if page.isdigit() else None
+    if not digest:
+        await callback_query.answer("⚠️ This digest has expired.", show_alert=True)
+        return
+
+    text, keyboard = render_digest(digest, int(page))
+    try:
+        await callback_query.message.edit_text(
+            text,
+            reply_markup=keyboard,
+            link_preview_options=LinkPreviewOptions(is_disabled=True)
+        )
+    except MessageNotModified:
+        pass
+    await callback_query.answer()
@@ -3,23 +3,29 @@ import json
 import httpx
 import random
 import string
+import time
 import asyncio
-import tempfile
-import os
+from io import BytesIO
 from pyrogram import Client as app, Client, filters
 from pyrogram.types import (
     Message, InputMediaPhoto,
     InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 )
-from pyrogram.errors import MediaCaptionTooLong
+from pyrogram.errors import MediaCaptionTooLong, BadRequest
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from helper.database import products, users
+from helper.product_key import canonical_product_key
+from helper.buyhatke import lookup_product
+from helper.resilience import CircuitOpenError
+from helper.image_cache import cached_file_ids, remember_file_ids, forget_file_ids
+# Temporarily holds product data before it's saved to the database.
+from helper.pending_store import pending_tracks
+from helper import metrics
 import logging
 
 logger = logging.getLogger(__name__)
 
-# This dictionary temporarily holds product data before it's saved to the database.
-pending_tracks = {}
-
 # --- Helper Functions ---
 
 def generate_product_id(length=12):
@@ -47,8 +53,8 @@ def parse_price(price_input):
         
     return {"string": original_string, "int": price_int}
 
-async def download_image(client: httpx.AsyncClient, url: str) -> str | None:
-    """Downloads an image from a URL to a temporary file and returns the path."""
+async def download_image(client: httpx.AsyncClient, url: str) -> BytesIO | None:
+    """Downloads an image from a URL into memory, named so Pyrogram can upload it."""
     try:
         response = await client.get(url, timeout=15)
         response.raise_for_status()
@@ -57,9 +63,9 @@ async def download_image(client: httpx.AsyncClient, url: str) -> str | None:
         if "webp" in url.lower() or response.headers.get("Content-Type", "").lower() == "image/webp":
             suffix = ".png"
 
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_file:
-            tmp_file.write(response.content)
-            return tmp_file.name
+        image = BytesIO(response.content)
+        image.name = f"image{suffix}"
+        return image
             
     except (httpx.RequestError, httpx.HTTPStatusError) as e:
         logger.warning(f"Could not download image {url}: {e}", exc_info=False)
@@ -68,6 +74,29 @@ async def download_image(client: httpx.AsyncClient, url: str) -> str | None:
         logger.error(f"Unexpected error downloading image {url}: {e}", exc_info=True)
         return None
 
+async def build_preview_media(http_client: httpx.AsyncClient, image_urls: list, use_cache: bool = True) -> list:
+    """
+    Returns (url, media, is_cached) for each usable image: the Telegram file_id
+    if the URL was uploaded before, otherwise the image downloaded into memory.
+    """
+    file_ids = await cached_file_ids(image_urls) if use_cache else {}
+    missing = [url for url in image_urls if url not in file_ids]
+    downloads = await asyncio.gather(*(download_image(http_client, url) for url in missing))
+    downloaded = {url: image for url, image in zip(missing, downloads) if image}
+
+    media = []
+    for url in image_urls:
+        if url in file_ids:
+            media.append((url, file_ids[url], True))
+        elif url in downloaded:
+            media.append((url, downloaded[url], False))
+    return media
+
+async def send_preview(client: Client, message: Message, media: list, caption: str) -> list:
+    media_to_send = [InputMediaPhoto(media=media[0][1], caption=caption)]
+    media_to_send.extend([InputMediaPhoto(media=item) for _, item, _ in media[1:]])
+    return await client.send_media_group(chat_id=message.chat.id, media=media_to_send, reply_to_message_id=message.id)
+
 # --- Link and Tracking Button Handlers ---
 
 # A broad regex to capture any valid URL. The API will handle unsupported domains.
@@ -77,19 +106,14 @@ URL_REGEX = r"https?://[^\s]+"
 async def product_link_handler(client: Client, message: Message):
     """Handles incoming e-commerce links using the new centralized API endpoint."""
     product_url = message.matches[0].group(0)
-    
-    api_endpoint = "https://e-com-price-tracker-lemon.vercel.app/buyhatke"
+    started = time.monotonic()
     
     processing_msg = await message.reply("⏳ **Fetching product details, please wait...**", quote=True)
     
-    downloaded_image_paths = []
     try:
-        async with httpx.AsyncClient(timeout=45.0) as http_client:
-            response = await http_client.get(api_endpoint, params={"product_url": product_url})
-            
-            # This will raise an exception for 4xx and 5xx responses, which is handled below
-            response.raise_for_status()
-            raw_data = response.json()
+        # Raises for 4xx and 5xx responses, which is handled below. Repeated pastes
+        # of the same link are answered from the lookup cache.
+        raw_data = await lookup_product(client.http, product_url)
 
         # Handle cases where the API returns 200 OK but contains an error message
         if "error" in raw_data or "detail" in raw_data:
@@ -106,13 +130,13 @@ async def product_link_handler(client: Client, message: Message):
             return
 
         product_id = generate_product_id()
-        pending_tracks[product_id] = {
+        await pending_tracks.put(product_id, {
             "api_data": product_main_data,
             "url": product_url,
             "user_id": message.from_user.id,
             "source": product_main_data.get('site_name', 'unknown').lower(),
             "currency_symbol": currency_symbol
-        }
+        })
         
         caption = (
             f"**{product_main_data.get('name', 'N/A')}**\n\n"
@@ -122,22 +146,38 @@ async def product_link_handler(client: Client, message: Message):
 
         keyboard = InlineKeyboardMarkup([[InlineKeyboardButton("✅ Start Tracking", callback_data=f"track_{product_id}")]])
         
-        image_urls = product_main_data.get("thumbnailImages", [])
-        
-        if image_urls:
-            async with httpx.AsyncClient(timeout=30.0) as http_client:
-                tasks = [download_image(http_client, url) for url in image_urls[:10]]
-                results = await asyncio.gather(*tasks)
-                downloaded_image_paths = [path for path in results if path]
+        image_urls = product_main_data.get("thumbnailImages", [])[:10]
+        media = await build_preview_media(client.http, image_urls)
 
-        if not downloaded_image_paths:
+        if not media:
             await processing_msg.edit(caption, reply_markup=keyboard)
             return
 
-        media_to_send = [InputMediaPhoto(media=downloaded_image_paths[0], caption=caption)]
-        media_to_send.extend([InputMediaPhoto(media=path) for path in downloaded_image_paths[1:]])
-            
-        await client.send_media_group(chat_id=message.chat.id, media=media_to_send, reply_to_message_id=message.id)
+        try:
+            sent_messages = await send_preview(client, message, media, caption)
+        except MediaCaptionTooLong:
+            raise
+        except BadRequest as e:
+            cached_urls = [url for url, _, is_cached in media if is_cached]
+            if not cached_urls:
+                raise
+            # A stored file_id was rejected, forget them and upload fresh copies.
+            logger.warning(f"Cached file_ids rejected for {product_url}, re-uploading: {e}")
+            await forget_file_ids(cached_urls)
+            media = await build_preview_media(client.http, image_urls, use_cache=False)
+            if not media:
+                await processing_msg.edit(caption, reply_markup=keyboard)
+                return
+            sent_messages = await send_preview(client, message, media, caption)
+
+        try:
+            await remember_file_ids({
+                url: sent.photo.file_id
+                for (url, _, is_cached), sent in zip(media, sent_messages)
+                if not is_cached and sent.photo
+            })
+        except Exception as e:
+            logger.warning(f"Could not cache image file_ids for {product_url}: {e}")
         await client.send_message(
             chat_id=message.chat.id,
             text="Press the button below to start tracking this item.",
@@ -168,6 +208,11 @@ async def product_link_handler(client: Client, message: Message):
             # Fallback for non-JSON errors or unexpected structures
             await processing_msg.edit(f"❌ **Error:** The API service responded with an error: `Status {e.response.status_code}`")
 
+    except CircuitOpenError:
+        await processing_msg.edit(
+            "⚠️ **The price tracker service is having trouble right now.**\n\n"
+            "Please try again in a few minutes."
+        )
     except httpx.RequestError as e:
         logger.error(f"RequestError for {product_url}: {e}", exc_info=True)
         await processing_msg.edit("❌ **Error:** Could not connect to the price tracker service.")
@@ -175,28 +220,27 @@ async def product_link_handler(client: Client, message: Message):
         logger.error(f"Unexpected error for {product_url}: {e}", exc_info=True)
         await processing_msg.edit("❌ **An unexpected error occurred.**")
     finally:
-        for path in downloaded_image_paths:
-            try:
-                os.remove(path)
-            except OSError as e:
-                logger.error(f"Error removing temp file {path}: {e}")
+        metrics.handler_seconds.observe(time.monotonic() - started, handler="product_link")
 
 @app.on_callback_query(filters.regex(r"^track_"))
 async def track_button_handler(client: Client, callback_query: CallbackQuery):
     """Handles the 'Start Tracking' button click and saves data to the database."""
-    product_id = callback_query.data.split("_", 1)[1]
+    pending_id = callback_query.data.split("_", 1)[1]
     user_id = callback_query.from_user.id
 
-    product_data = pending_tracks.get(product_id)
+    product_data = await pending_tracks.get(pending_id)
     if not product_data or product_data.get("user_id") != user_id:
         await callback_query.answer("This request has expired. Please send the link again.", show_alert=True)
         return
 
+    product_id = pending_id
     try:
         api_data = product_data["api_data"]
-        
+        product_key = canonical_product_key(product_data["source"], api_data.get('pid'), product_data["url"])
+
         product_doc = {
-            '_id': product_id,
+            '_id': pending_id,
+            'product_key': product_key,
             'userid': user_id,
             'url': product_data["url"],
             'source': product_data["source"],
@@ -215,13 +259,26 @@ async def track_button_handler(client: Client, callback_query: CallbackQuery):
             }
         }
         
-        products.insert_one(product_doc)
-        users.update_one(
+        # Everyone tracking the same item shares one product document.
+        try:
+            stored = await products.find_one_and_update(
+                {"product_key": product_key},
+                {"$setOnInsert": product_doc},
+                projection={"_id": 1},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Another user inserted the same product at the same moment.
+            stored = await products.find_one({"product_key": product_key}, {"_id": 1})
+        product_id = stored["_id"]
+
+        await users.update_one(
             {"user_id": str(user_id)},
-            {"$push": {"trackings": product_id}},
+            {"$addToSet": {"trackings": product_id}},
             upsert=True
         )
-        del pending_tracks[product_id]
+        await pending_tracks.pop(pending_id)
 
         await callback_query.answer("✅ Successfully started tracking this product!", show_alert=True)
         await callback_query.message.edit_text(
@@ -1,12 +1,13 @@
-import os, random, asyncio
-from pyrogram import Client as app, filters, types, enums, errors
-from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton, Message
-from pyrogram.errors import UserNotParticipant, FloodWait, UserDeactivated, UserIsBlocked
+from pyrogram import Client as app, filters, types, enums
+from pyrogram.types import Message
+from pyrogram.errors import UserNotParticipant
 
 # Local imports
 from config import Telegram
-from helper.database import add_user, all_users, users, remove_user
+from helper.database import add_user
+from helper.stats_snapshot import get_stats
 from helper.message_text import text_messages, message_buttons
+from helper.broadcast import create_broadcast, start_broadcast, cancel_broadcast, latest_broadcast
 
 
 @app.on_message(filters.command("start"))
@@ -46,7 +47,7 @@ async def help_command(client, msg: types.Message):
 
 @app.on_message(filters.command("users") & filters.user(Telegram.ADMIN))
 async def dbtool(client, message):
-    xx = all_users()
+    xx = (await get_stats())["total_users"]
     await message.reply(f"""
 🍀 Chats Stats 🍀
 🙋‍♂️ Users : `{xx}` """)
@@ -54,105 +55,57 @@ async def dbtool(client, message):
 
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━ Broadcast Copy ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 @app.on_message(filters.command("bcast") & filters.user(Telegram.ADMIN))
-async def bcast(_, m: Message):
+async def bcast(client, m: Message):
     if not m.reply_to_message:
         await m.reply_text("❌ Please reply to a message to broadcast it.")
         return
 
-    allusers = users
     lel = await m.reply_text("`⚡️ Processing...`")
-
-    success = failed = deactivated = blocked = 0
-
-    for count, usrs in enumerate(allusers.find(), start=1):
-        userid = usrs.get("user_id")
-        try:
-            await m.reply_to_message.copy(int(userid))
-            success += 1
-        except FloodWait as ex:
-            await asyncio.sleep(ex.value)
-            await m.reply_to_message.copy(int(userid))
-            success += 1
-        except errors.InputUserDeactivated:
-            deactivated += 1
-            remove_user(userid)
-        except errors.UserIsBlocked:
-            blocked += 1
-        except Exception as e:
-            print(f"Failed to send to {userid}: {e}")
-            failed += 1
-
-        # 🔄 Update every 50 users
-        if count % 50 == 0:
-            try:
-                await lel.edit(
-                    f"📢 Broadcasting...\n"
-                    f"✅ Sent: `{success}`\n"
-                    f"❌ Failed: `{failed}`\n"
-                    f"👾 Blocked: `{blocked}`\n"
-                    f"👻 Deactivated: `{deactivated}`\n"
-                    f"📊 Processed: `{count}` users"
-                )
-            except Exception:
-                pass
-
-    # ✅ Final result
-    await lel.edit(
-        f"✅ Successfully sent to `{success}` users.\n"
-        f"❌ Failed to send to `{failed}` users.\n"
-        f"👾 Found `{blocked}` blocked users\n"
-        f"👻 Found `{deactivated}` deactivated users."
-    )
+    await create_broadcast(client, "copy", m.reply_to_message, lel)
 
 
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━ Broadcast Forward ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 @app.on_message(filters.command("fcast") & filters.user(Telegram.ADMIN))
-async def fcast(_, m: Message):
+async def fcast(client, m: Message):
     if not m.reply_to_message:
         await m.reply_text("❌ Please reply to a message to forward-broadcast it.")
         return
 
-    allusers = users
     lel = await m.reply_text("`⚡️ Processing...`")
-
-    success = failed = deactivated = blocked = 0
-
-    for count, usrs in enumerate(allusers.find(), start=1):
-        userid = usrs.get("user_id")
-        try:
-            await m.reply_to_message.forward(int(userid))
-            success += 1
-        except FloodWait as ex:
-            await asyncio.sleep(ex.value)
-            await m.reply_to_message.forward(int(userid))
-            success += 1
-        except errors.InputUserDeactivated:
-            deactivated += 1
-            remove_user(userid)
-        except errors.UserIsBlocked:
-            blocked += 1
-        except Exception as e:
-            print(f"Failed to forward to {userid}: {e}")
-            failed += 1
-
-        # 🔄 Update every 50 users
-        if count % 50 == 0:
-            try:
-                await lel.edit(
-                    f"📢 Forwarding...\n"
-                    f"✅ Forwarded: `{success}`\n"
-                    f"❌ Failed: `{failed}`\n"
-                    f"👾 Blocked: `{blocked}`\n"
-                    f"👻 Deactivated: `{deactivated}`\n"
-                    f"📊 Processed: `{count}` users"
-                )
-            except Exception:
-                pass
-
-    # ✅ Final result
-    await lel.edit(
-        f"✅ Successfully forwarded to `{success}` users.\n"
-        f"❌ Failed to forward to `{failed}` users.\n"
-        f"👾 Found `{blocked}` blocked users \n"
-        f"👻 Found `{deactivated}` deactivated users."
-    )
+    await create_broadcast(client, "forward", m.reply_to_message, lel)
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━ Broadcast Control ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+@app.on_message(filters.command("bcast_resume") & filters.user(Telegram.ADMIN))
+async def bcast_resume(client, m: Message):
+    """Resumes a broadcast from its last checkpoint, e.g. after a restart."""
+    if len(m.command) > 1:
+        broadcast_id = m.command[1].lstrip("#")
+    else:
+        doc = await latest_broadcast(["running", "interrupted"])
+        if not doc:
+            await m.reply_text("🤷‍♂️ No unfinished broadcast to resume.")
+            return
+        broadcast_id = doc["_id"]
+
+    if start_broadcast(client, broadcast_id):
+        await m.reply_text(f"▶️ Resuming broadcast `#{broadcast_id}` from its last checkpoint.")
+    else:
+        await m.reply_text(f"⚠️ Broadcast `#{broadcast_id}` is already running.")
+
+
+@app.on_message(filters.command("bcast_cancel") & filters.user(Telegram.ADMIN))
+async def bcast_cancel(client, m: Message):
+    if len(m.command) > 1:
+        broadcast_id = m.command[1].lstrip("#")
+    else:
+        doc = await latest_broadcast(["running", "interrupted"])
+        if not doc:
+            await m.reply_text("🤷‍♂️ No unfinished broadcast to cancel.")
+            return
+        broadcast_id = doc["_id"]
+
+    if await cancel_broadcast(broadcast_id):
+        await m.reply_text(f"🛑 Broadcast `#{broadcast_id}` cancelled.")
+    else:
+        await m.reply_text(f"⚠️ Broadcast `#{broadcast_id}` not found or already finished.")
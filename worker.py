@@ -0,0 +1,62 @@
+import asyncio
+import logging
+from pyrogram import Client
+from config import Telegram, Workers
+from helper.logger_setup import init_logger
+from helper.price_checker import run_price_check
+from helper.database import ensure_indexes
+from helper.http_client import create_http_client
+from helper.scheduler import seconds_until_next_due, refresh_budget_scale
+from helper.leases import OWNER, leased_due_products
+
+# Standalone price checker. Run any number of these next to main.py; each one
+# leases batches of due products from Mongo, so they split the catalog without
+# checking (or notifying about) the same product twice. Handlers, cleanups and
+# broadcasts stay in the bot process.
+
+
+async def worker_loop(client: Client):
+    # Normally done by the bot on start; a no-op when the indexes exist.
+    await ensure_indexes()
+    while True:
+        try:
+            async with leased_due_products(Workers.BATCH) as due_ids:
+                if due_ids:
+                    await refresh_budget_scale()
+                    await run_price_check(client, manual_trigger=False, product_ids=due_ids)
+            if not due_ids:
+                await asyncio.sleep(await seconds_until_next_due())
+        except Exception:
+            logging.exception(f"Worker {OWNER} tick failed")
+            await asyncio.sleep(30)
+
+
+# Sends alerts with the bot's token but never receives updates, so the bot
+# process keeps handling every command.
+app = Client(
+    f"{Telegram.BOT_NICKNAME}-worker",
+    api_id=Telegram.API_ID,
+    api_hash=Telegram.API_HASH,
+    bot_token=Telegram.BOT_TOKEN,
+    in_memory=True,
+    no_updates=True,
+)
+app.http = create_http_client()
+
+
+def main():
+    init_logger(app, __name__)
+    print(f"Worker {OWNER} started")
+
+    app.start()
+    try:
+        app.loop.run_until_complete(worker_loop(app))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        app.loop.run_until_complete(app.http.aclose())
+        app.stop()
+
+
+if __name__ == "__main__":
+    main()